@@ -0,0 +1,373 @@
+import asyncio
+import json
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urljoin
+
+from api_auth import API_BASE_URL, API_VERSION
+from api_http import DEFAULT_TIMEOUT, POOL_MAXSIZE
+
+try:
+    import httpx
+except ImportError:  # httpx is only needed for the async client
+    httpx = None
+
+
+def is_available() -> bool:
+    """Check whether the async client can be used"""
+    return httpx is not None
+
+
+def create_client() -> "httpx.AsyncClient":
+    """Create an AsyncClient with the same limits and timeouts as the shared session"""
+    if httpx is None:
+        raise ImportError("The async API client requires httpx: pip install 'desi-dialect-map[async]'")
+    connect_timeout, read_timeout = DEFAULT_TIMEOUT
+    return httpx.AsyncClient(
+        base_url=f"{API_BASE_URL}/api/{API_VERSION}",
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        limits=httpx.Limits(max_connections=POOL_MAXSIZE),
+        transport=httpx.AsyncHTTPTransport(retries=2),
+    )
+
+
+# httpx clients are bound to the event loop that uses them, so each loop keeps its own
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = \
+    weakref.WeakKeyDictionary()
+
+
+def get_client() -> "httpx.AsyncClient":
+    """Get the AsyncClient of the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = create_client()
+    return client
+
+
+def request_error(error: "httpx.HTTPError") -> Dict[str, Any]:
+    """Describe a failed request as {"error": ...}, with the HTTP status when there was one"""
+    result: Dict[str, Any] = {"error": str(error)}
+    if isinstance(error, httpx.HTTPStatusError):
+        result["status"] = error.response.status_code
+    return result
+
+
+def is_unauthorized(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("status") == 401
+
+
+class AsyncCorpusAPIAuth:
+    """Async authentication handler for Indic Corpus Collections API"""
+
+    def __init__(self, client: "httpx.AsyncClient", access_token: Optional[str] = None,
+                 user_info: Optional[Dict[str, Any]] = None):
+        self.client = client
+        self.access_token = access_token
+        self.user_info = user_info
+
+    @classmethod
+    def from_sync(cls, client: "httpx.AsyncClient", auth) -> "AsyncCorpusAPIAuth":
+        """Create an async handler sharing the credentials of a CorpusAPIAuth"""
+        return cls(client, auth.access_token, auth.user_info)
+
+    def _get_headers(self, include_auth: bool = True) -> Dict[str, str]:
+        """Get request headers"""
+        headers = {
+            "Content-Type": "application/json",
+            "accept": "application/json"
+        }
+        if include_auth and self.access_token:
+            headers["Authorization"] = f"Bearer {self.access_token}"
+        return headers
+
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                            include_auth: bool = True, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Make API request with error handling
+
+        Errors are returned as {"error": ...} rather than shown, since this
+        runs off the Streamlit script thread; callers report them there.
+        """
+        headers = self._get_headers(include_auth)
+
+        try:
+            if method.upper() == "GET":
+                response = await self.client.get(endpoint, headers=headers, params=params)
+            elif method.upper() == "POST":
+                response = await self.client.post(endpoint, headers=headers, json=data)
+            else:
+                raise ValueError(f"Unsupported HTTP method: {method}")
+
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPError as e:
+            return request_error(e)
+        except json.JSONDecodeError:
+            return {"error": "Invalid response format"}
+
+    def _store_login(self, result: Dict[str, Any], with_user_info: bool = True):
+        if "access_token" in result:
+            self.access_token = result["access_token"]
+            if with_user_info:
+                self.user_info = {
+                    "user_id": result.get("user_id"),
+                    "phone_number": result.get("phone_number"),
+                    "roles": result.get("roles", [])
+                }
+
+    async def send_login_otp(self, phone_number: str) -> Dict[str, Any]:
+        """Send OTP for login"""
+        data = {"phone_number": phone_number}
+        return await self._make_request("POST", "/auth/login/send-otp", data, include_auth=False)
+
+    async def verify_login_otp(self, phone_number: str, otp_code: str,
+                               has_given_consent: bool = True) -> Dict[str, Any]:
+        """Verify OTP for login"""
+        data = {
+            "phone_number": phone_number,
+            "otp_code": otp_code,
+            "has_given_consent": has_given_consent
+        }
+        result = await self._make_request("POST", "/auth/login/verify-otp", data, include_auth=False)
+        self._store_login(result)
+        return result
+
+    async def resend_login_otp(self, phone_number: str) -> Dict[str, Any]:
+        """Resend OTP for login"""
+        data = {"phone_number": phone_number}
+        return await self._make_request("POST", "/auth/login/resend-otp", data, include_auth=False)
+
+    async def login_with_password(self, phone: str, password: str) -> Dict[str, Any]:
+        """Login with phone and password"""
+        data = {"phone": phone, "password": password}
+        result = await self._make_request("POST", "/auth/login", data, include_auth=False)
+        self._store_login(result, with_user_info=False)
+        return result
+
+    async def send_signup_otp(self, phone_number: str) -> Dict[str, Any]:
+        """Send OTP for signup"""
+        data = {"phone_number": phone_number}
+        return await self._make_request("POST", "/auth/signup/send-otp", data, include_auth=False)
+
+    async def verify_signup_otp(self, phone_number: str, otp_code: str, name: str,
+                                email: str, password: str,
+                                has_given_consent: bool = True) -> Dict[str, Any]:
+        """Verify OTP and create new user account"""
+        data = {
+            "phone_number": phone_number,
+            "otp_code": otp_code,
+            "name": name,
+            "email": email,
+            "password": password,
+            "has_given_consent": has_given_consent
+        }
+        result = await self._make_request("POST", "/auth/signup/verify-otp", data, include_auth=False)
+        self._store_login(result)
+        return result
+
+    async def resend_signup_otp(self, phone_number: str) -> Dict[str, Any]:
+        """Resend OTP for signup"""
+        data = {"phone_number": phone_number}
+        return await self._make_request("POST", "/auth/signup/resend-otp", data, include_auth=False)
+
+    async def get_current_user(self) -> Dict[str, Any]:
+        """Get current user information"""
+        return await self._make_request("GET", "/auth/me")
+
+    async def change_password(self, current_password: str, new_password: str) -> Dict[str, Any]:
+        """Change current user's password"""
+        data = {
+            "current_password": current_password,
+            "new_password": new_password
+        }
+        return await self._make_request("POST", "/auth/change-password", data)
+
+    async def refresh_token(self) -> Dict[str, Any]:
+        """Refresh access token"""
+        result = await self._make_request("POST", "/auth/refresh")
+        if "access_token" in result:
+            self.access_token = result["access_token"]
+        return result
+
+    async def forgot_password_init(self, phone_number: str) -> Dict[str, Any]:
+        """Initiate password reset"""
+        data = {"phone_number": phone_number}
+        return await self._make_request("POST", "/auth/forgot-password/init", data, include_auth=False)
+
+    async def forgot_password_confirm(self, phone_number: str, otp_code: str,
+                                      new_password: str, confirm_password: str) -> Dict[str, Any]:
+        """Confirm password reset"""
+        data = {
+            "phone_number": phone_number,
+            "otp_code": otp_code,
+            "new_password": new_password,
+            "confirm_password": confirm_password
+        }
+        return await self._make_request("POST", "/auth/forgot-password/confirm", data, include_auth=False)
+
+    async def reset_password(self, phone: str, new_password: str) -> Dict[str, Any]:
+        """Reset user password (admin functionality)"""
+        data = {"phone": phone, "new_password": new_password}
+        return await self._make_request("POST", "/auth/reset-password", data)
+
+    def is_authenticated(self) -> bool:
+        """Check if user is authenticated"""
+        return self.access_token is not None
+
+    def logout(self):
+        """Logout user"""
+        self.access_token = None
+        self.user_info = None
+
+    def get_user_info(self) -> Optional[Dict[str, Any]]:
+        """Get cached user information"""
+        return self.user_info
+
+
+class AsyncCorpusAPICategories:
+    """Async categories handler for Indic Corpus Collections API"""
+
+    def __init__(self, auth: AsyncCorpusAPIAuth):
+        self.auth = auth
+
+    async def get_categories(self) -> Any:
+        """Get all categories, or {"error": ...} if the request failed"""
+        result = await self.auth._make_request("GET", "/categories/")
+        if isinstance(result, dict) and "error" in result:
+            return result
+        return result if isinstance(result, list) else []
+
+
+class AsyncCorpusAPIRecords:
+    """Async records handler for Indic Corpus Collections API"""
+
+    def __init__(self, auth: AsyncCorpusAPIAuth):
+        self.auth = auth
+
+    async def get_records(self, **params: Any) -> Any:
+        """Get one page of records, or {"error": ...} if the request failed"""
+        params = {key: value for key, value in params.items() if value is not None}
+        result = await self.auth._make_request("GET", "/records/", params=params)
+        if isinstance(result, dict) and "error" in result:
+            return result
+        return result if isinstance(result, list) else []
+
+    async def get_media(self, record_id: str) -> Any:
+        """Get the media file of a record: its bytes, None if it has none, or {"error": ...}"""
+        record = await self.auth._make_request("GET", f"/records/{record_id}")
+        if not isinstance(record, dict) or "error" in record:
+            return record
+        file_url = record.get("file_url")
+        if not file_url:
+            return None
+        headers = self.auth._get_headers()
+        headers.pop("Content-Type")
+        headers["accept"] = "*/*"
+        try:
+            response = await self.auth.client.get(urljoin(str(self.auth.client.base_url), file_url),
+                                                  headers=headers)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            return request_error(e)
+        return response.content
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Get the event loop thread that runs every gather of the process"""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="api-async-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coroutine: Awaitable[Any]) -> Any:
+    """Run a coroutine to completion from synchronous Streamlit code
+
+    Coroutines run on one long-lived event loop thread, so its AsyncClient
+    and keep-alive connections are reused across reruns and sessions. This
+    works whether or not the caller is itself inside an event loop.
+    """
+    loop = _get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        raise RuntimeError("run_sync cannot be called from a coroutine running on its own loop")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+PageCall = Callable[[AsyncCorpusAPIAuth, AsyncCorpusAPICategories, AsyncCorpusAPIRecords], Awaitable[Any]]
+
+
+async def gather_calls(access_token: Optional[str], calls: Dict[str, PageCall]) -> Dict[str, Any]:
+    """Run independent API calls concurrently and return their results by name
+
+    Each call receives async auth, categories and records handlers that
+    send access_token. A failing call yields {"error": ...} without
+    cancelling the others.
+    """
+    async_auth = AsyncCorpusAPIAuth(get_client(), access_token)
+    async_categories = AsyncCorpusAPICategories(async_auth)
+    async_records = AsyncCorpusAPIRecords(async_auth)
+    names = list(calls)
+    results = await asyncio.gather(
+        *(calls[name](async_auth, async_categories, async_records) for name in names),
+        return_exceptions=True,
+    )
+    return {
+        name: {"error": str(result)} if isinstance(result, Exception) else result
+        for name, result in zip(names, results)
+    }
+
+
+def run_calls(auth, calls: Dict[str, PageCall]) -> Dict[str, Any]:
+    """Run calls concurrently with the token of auth, a CorpusAPIAuth
+
+    Token refreshes are blocking requests, so they happen here on the
+    calling thread and never stall the shared event loop. Calls the API
+    answered with 401 are retried once after the token is refreshed, as
+    api_http.send_authorized does for blocking requests.
+    """
+    auth.ensure_fresh_token()
+    token = auth.access_token
+    results = run_sync(gather_calls(token, calls))
+    rejected = {name: calls[name] for name, result in results.items() if is_unauthorized(result)}
+    if rejected and token and auth.refresh_rejected_token(token):
+        results.update(run_sync(gather_calls(auth.access_token, rejected)))
+    return results
+
+
+def gather_page_data(auth, include_categories: bool = True, include_current_user: bool = True,
+                     include_records: bool = False, user_id: Optional[str] = None,
+                     user_records_limit: Optional[int] = None,
+                     random_record_id: Optional[str] = None) -> Dict[str, Any]:
+    """Fetch the independent data a page render needs in one concurrent round
+
+    Render latency is then bounded by the slowest call instead of their sum.
+    Results are keyed "categories", "current_user", "records" (one record,
+    the connection check), "user_records" (the first page of user_id's
+    records) and "random_record_media"; a failed call yields {"error": ...}.
+    """
+    calls: Dict[str, PageCall] = {}
+    if include_categories:
+        calls["categories"] = lambda a, c, r: c.get_categories()
+    if include_current_user:
+        calls["current_user"] = lambda a, c, r: a.get_current_user()
+    if include_records:
+        calls["records"] = lambda a, c, r: r.get_records(limit=1)
+    if user_id:
+        calls["user_records"] = lambda a, c, r: r.get_records(user_id=user_id, limit=user_records_limit)
+    if random_record_id:
+        calls["random_record_media"] = lambda a, c, r: r.get_media(random_record_id)
+    if not calls:
+        return {}
+    return run_calls(auth, calls)
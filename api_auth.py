@@ -1,21 +1,56 @@
 import requests
 import streamlit as st
+import base64
 import json
+import threading
 from typing import Optional, Dict, Any
 import time
+from api_http import SingleFlight, coalesced_get, get_session, send_authorized
 
 # API Configuration
 API_BASE_URL = "https://api.corpus.swecha.org"
 API_VERSION = "v1"
 
+# Seconds before expiry at which a token is refreshed in the background
+TOKEN_REFRESH_MARGIN = 120
+# Below this many seconds of validity the refresh happens before the request instead
+TOKEN_MIN_VALIDITY = 10
+# Seconds between background refresh attempts for a token whose refresh failed
+TOKEN_REFRESH_RETRY_INTERVAL = 30
+
+# Seconds the /auth/me profile is reused before it is fetched again
+USER_PROFILE_TTL = 60
+
+
+def decode_token_expiry(token: Optional[str]) -> Optional[float]:
+    """Get the exp claim of a JWT as a Unix timestamp, or None if it has none
+
+    The signature is not verified; the expiry is only used to schedule refreshes.
+    """
+    if not token:
+        return None
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
 class CorpusAPIAuth:
     """Authentication handler for Indic Corpus Collections API"""
     
     def __init__(self):
         self.base_url = f"{API_BASE_URL}/api/{API_VERSION}"
-        self.session = requests.Session()
+        self.session = get_session()
         self.access_token = None
         self.user_info = None
+        self._refresh_flight = SingleFlight()
+        self._background_refresh: Dict[str, float] = {}
+        self._profile_lock = threading.Lock()
+        # token -> (expires_at, profile); only the current token's entry is kept
+        self._profile_cache: Dict[str, tuple] = {}
     
     def _get_headers(self, include_auth: bool = True) -> Dict[str, str]:
         """Get request headers"""
@@ -27,19 +62,29 @@ class CorpusAPIAuth:
             headers["Authorization"] = f"Bearer {self.access_token}"
         return headers
     
+    def _send(self, method: str, url: str, data: Optional[Dict],
+              headers: Dict[str, str]) -> requests.Response:
+        if method.upper() == "GET":
+            return coalesced_get(self.session, url, headers=headers)
+        elif method.upper() == "POST":
+            return self.session.post(url, headers=headers, json=data)
+        else:
+            raise ValueError(f"Unsupported HTTP method: {method}")
+    
     def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None, 
                      include_auth: bool = True) -> Dict[str, Any]:
         """Make API request with error handling"""
         url = f"{self.base_url}{endpoint}"
-        headers = self._get_headers(include_auth)
         
         try:
-            if method.upper() == "GET":
-                response = self.session.get(url, headers=headers)
-            elif method.upper() == "POST":
-                response = self.session.post(url, headers=headers, json=data)
+            if include_auth:
+                self.ensure_fresh_token()
+                response = send_authorized(
+                    self, lambda headers: self._send(method, url, data, headers),
+                    self._get_headers(include_auth=False),
+                )
             else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+                response = self._send(method, url, data, self._get_headers(include_auth=False))
             
             response.raise_for_status()
             return response.json()
@@ -127,20 +172,127 @@ class CorpusAPIAuth:
         """Get current user information"""
         return self._make_request("GET", "/auth/me")
     
+    def get_current_user_cached(self) -> Dict[str, Any]:
+        """Get current user information, reusing it for USER_PROFILE_TTL seconds
+        
+        The profile is cached under the access token it was fetched with,
+        so a different login never sees it. Errors are not cached.
+        """
+        token = self.access_token
+        if token:
+            with self._profile_lock:
+                entry = self._profile_cache.get(token)
+                if entry is not None and entry[0] > time.monotonic():
+                    return entry[1]
+        
+        profile = self.get_current_user()
+        if "error" not in profile:
+            self.prime_current_user(profile, token)
+        return profile
+    
+    def has_cached_current_user(self) -> bool:
+        """Check whether get_current_user_cached would be served without a request"""
+        with self._profile_lock:
+            entry = self._profile_cache.get(self.access_token)
+            return entry is not None and entry[0] > time.monotonic()
+    
+    def prime_current_user(self, profile: Dict[str, Any], token: Optional[str] = None):
+        """Cache a /auth/me profile fetched elsewhere, e.g. by the async client"""
+        token = token or self.access_token
+        if not token or token != self.access_token:
+            return
+        with self._profile_lock:
+            self._profile_cache = {token: (time.monotonic() + USER_PROFILE_TTL, profile)}
+    
+    def invalidate_current_user(self):
+        """Drop the cached profile so the next read fetches /auth/me again"""
+        with self._profile_lock:
+            self._profile_cache = {}
+    
     def change_password(self, current_password: str, new_password: str) -> Dict[str, Any]:
         """Change current user's password"""
         data = {
             "current_password": current_password,
             "new_password": new_password
         }
-        return self._make_request("POST", "/auth/change-password", data)
+        result = self._make_request("POST", "/auth/change-password", data)
+        if "error" not in result:
+            self.invalidate_current_user()
+        return result
     
     def refresh_token(self) -> Dict[str, Any]:
         """Refresh access token"""
-        result = self._make_request("POST", "/auth/refresh")
-        if "access_token" in result:
-            self.access_token = result["access_token"]
-        return result
+        token = self.access_token
+        if not token:
+            return {"error": "Not authenticated"}
+        if self._refresh(token):
+            return {"access_token": self.access_token}
+        return {"error": "Token refresh failed"}
+    
+    def refresh_rejected_token(self, token: str) -> bool:
+        """Refresh after the API rejected token with a 401; True if a newer token is now in use"""
+        return self._refresh(token)
+    
+    def _refresh(self, token: str) -> bool:
+        """Replace token with a refreshed one; True if a newer token is now in use
+
+        Concurrent callers holding the same token share a single
+        /auth/refresh call, and callers arriving after another thread already
+        swapped the token return immediately.
+        """
+        if self.access_token != token:
+            return self.access_token is not None
+        return self._refresh_flight.do(token, lambda: self._do_refresh(token))
+    
+    def _do_refresh(self, token: str) -> bool:
+        try:
+            response = self.session.post(
+                f"{self.base_url}/auth/refresh",
+                headers={
+                    "Content-Type": "application/json",
+                    "accept": "application/json",
+                    "Authorization": f"Bearer {token}",
+                },
+            )
+            response.raise_for_status()
+            new_token = response.json().get("access_token")
+        except (requests.exceptions.RequestException, ValueError, AttributeError) as e:
+            # Runs on background threads too, where st.error is unavailable
+            print(f"Token refresh failed: {e}")
+            return False
+        
+        if not new_token or self.access_token != token:
+            # Logged out or logged in again while the refresh was in flight
+            return False
+        self.access_token = new_token
+        with self._profile_lock:
+            # Same user, new token: keep the cached profile
+            if token in self._profile_cache:
+                self._profile_cache = {new_token: self._profile_cache[token]}
+        return True
+    
+    def ensure_fresh_token(self):
+        """Refresh the access token ahead of its expiry
+        
+        Tokens close to expiry are refreshed on a background thread while
+        the current request still uses the old token; tokens that are
+        (almost) expired are refreshed before the request is sent.
+        """
+        token = self.access_token
+        expires_at = decode_token_expiry(token)
+        if expires_at is None:
+            return
+        remaining = expires_at - time.time()
+        if remaining > TOKEN_REFRESH_MARGIN:
+            return
+        if remaining > TOKEN_MIN_VALIDITY:
+            now = time.monotonic()
+            if now - self._background_refresh.get(token, 0.0) < TOKEN_REFRESH_RETRY_INTERVAL:
+                return
+            self._background_refresh = {token: now}
+            threading.Thread(target=self._refresh, args=(token,), daemon=True).start()
+        else:
+            self._refresh(token)
     
     def forgot_password_init(self, phone_number: str) -> Dict[str, Any]:
         """Initiate password reset"""
@@ -171,15 +323,61 @@ class CorpusAPIAuth:
         """Logout user"""
         self.access_token = None
         self.user_info = None
-        self.session = requests.Session()
+        self.invalidate_current_user()
     
     def get_user_info(self) -> Optional[Dict[str, Any]]:
         """Get cached user information"""
         return self.user_info
 
 
-# Global API auth instance
-api_auth = CorpusAPIAuth()
+# Session state key holding each browser session's own client
+SESSION_CLIENT_KEY = "api_auth_client"
+
+# Used outside a Streamlit script run (tests, scripts, worker threads without a context)
+_fallback_client = CorpusAPIAuth()
+
+
+def _in_script_run() -> bool:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return False
+    return get_script_run_ctx() is not None
+
+
+def get_api_auth() -> CorpusAPIAuth:
+    """Get the API client of the current Streamlit session
+    
+    Each browser session gets its own CorpusAPIAuth, stored in its session
+    state, so tokens and cached profiles never cross between concurrent
+    users. All clients share the process-wide connection pool.
+    """
+    if not _in_script_run():
+        return _fallback_client
+    client = st.session_state.get(SESSION_CLIENT_KEY)
+    if client is None:
+        client = st.session_state[SESSION_CLIENT_KEY] = CorpusAPIAuth()
+    return client
+
+
+class SessionAuthProxy:
+    """Forwards attribute access to the current session's CorpusAPIAuth
+    
+    Lets modules keep using a module-level api_auth while every Streamlit
+    session talks to its own client. Code handing the client to other
+    threads should pass get_api_auth() instead, since those threads have
+    no session.
+    """
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_api_auth(), name)
+    
+    def __setattr__(self, name: str, value: Any):
+        setattr(get_api_auth(), name, value)
+
+
+# Global API auth proxy; resolves to the calling session's client
+api_auth = SessionAuthProxy()
 
 
 def init_session_state():
@@ -205,11 +403,19 @@ def save_auth_to_session():
 
 
 def load_auth_from_session():
-    """Load authentication data from session state"""
-    if st.session_state.api_auth_token:
-        api_auth.access_token = st.session_state.api_auth_token
-    if st.session_state.api_user_info:
-        api_auth.user_info = st.session_state.api_user_info
+    """Load authentication data from session state
+    
+    The session's client normally still holds its token across reruns;
+    this restores it when the client was recreated.
+    """
+    client = get_api_auth()
+    if client.access_token:
+        # Keep session state in step with tokens refreshed by the client
+        st.session_state.api_auth_token = client.access_token
+    elif st.session_state.api_auth_token:
+        client.access_token = st.session_state.api_auth_token
+    if st.session_state.api_user_info and not client.user_info:
+        client.user_info = st.session_state.api_user_info
 
 
 def clear_auth_session():
@@ -1,5 +1,5 @@
 import streamlit as st
-from api_auth import api_auth, init_session_state, save_auth_to_session, load_auth_from_session, clear_auth_session
+from api_auth import api_auth, get_api_auth, init_session_state, save_auth_to_session, load_auth_from_session, clear_auth_session
 import re
 
 def validate_phone_number(phone: str) -> bool:
@@ -230,7 +230,7 @@ def show_authenticated_user():
         st.success(f"✅ Logged in as {user_info.get('phone_number', 'User')}")
         
         # Get detailed user info
-        detailed_info = api_auth.get_current_user()
+        detailed_info = api_auth.get_current_user_cached()
         if "error" not in detailed_info:
             st.info(f"👤 {detailed_info.get('name', 'User')}")
             st.info(f"📧 {detailed_info.get('email', 'No email')}")
@@ -345,7 +345,7 @@ def main_api_interface():
     st.success("🔗 Connected to Indic Corpus Collections API")
     
     # Show user info
-    user_info = api_auth.get_current_user()
+    user_info = api_auth.get_current_user_cached()
     if "error" not in user_info:
         st.info(f"Welcome, {user_info.get('name', 'User')}!")
     
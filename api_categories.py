@@ -1,19 +1,79 @@
 import requests
 import streamlit as st
 import json
-from typing import Optional, Dict, Any, List
+import threading
+import time
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Mapping, Tuple
 from api_auth import api_auth
+from api_http import coalesced_get, get_session
 
 # API Configuration
 API_BASE_URL = "https://api.corpus.swecha.org"
 API_VERSION = "v1"
 
+# Seconds a fetched category list is served before it is revalidated
+CATEGORIES_CACHE_TTL = 300
+# Seconds a caller waits for another thread's in-flight fetch
+CATEGORIES_FETCH_WAIT = 30
+
+class CategoryIndex:
+    """Lookups derived once from a snapshot of the category list
+
+    The index is shared by every session, so each category is a read-only
+    view of a copy, and the collections holding them are tuples or
+    read-only mappings that callers cannot change for each other.
+    """
+    
+    def __init__(self, categories: List[Dict[str, Any]]):
+        categories = tuple(MappingProxyType(dict(category)) for category in categories)
+        self.categories = categories
+        self.by_id = MappingProxyType({category.get("id"): category for category in categories})
+        self.published = tuple(cat for cat in categories if cat.get("published", False))
+        
+        categories_by_rank: Dict[Any, int] = {}
+        for category in categories:
+            rank = category.get("rank", 0)
+            categories_by_rank[rank] = categories_by_rank.get(rank, 0) + 1
+        
+        self.statistics = {
+            "total_categories": len(categories),
+            "published_categories": len(self.published),
+            "unpublished_categories": len(categories) - len(self.published),
+            "categories_by_rank": categories_by_rank
+        }
+        
+        self.options = (("Select a category", None),) + tuple(
+            (category.get("title", category.get("name", "Unknown")), category.get("id"))
+            for category in self.published
+        )
+        self.default_category = self._choose_default_category()
+    
+    def _choose_default_category(self) -> Optional[Mapping[str, Any]]:
+        """Pick the first published dialect/language category, else the first published one"""
+        for category in self.published:
+            name = category.get("name", "").lower()
+            if "dialect" in name or "language" in name:
+                return category
+        return self.published[0] if self.published else None
+
+
+EMPTY_CATEGORY_INDEX = CategoryIndex([])
+
+
 class CorpusAPICategories:
     """Categories management handler for Indic Corpus Collections API"""
     
-    def __init__(self):
+    def __init__(self, cache_ttl: float = CATEGORIES_CACHE_TTL):
         self.base_url = f"{API_BASE_URL}/api/{API_VERSION}"
-        self.session = requests.Session()
+        self.session = get_session()
+        self.cache_ttl = cache_ttl
+        self._cache_lock = threading.Lock()
+        self._categories: Optional[List[Dict[str, Any]]] = None
+        self._etag: Optional[str] = None
+        self._fetched_at = 0.0
+        self._inflight: Optional[threading.Event] = None
+        self._index = EMPTY_CATEGORY_INDEX
     
     def _get_headers(self, include_auth: bool = True) -> Dict[str, str]:
         """Get request headers"""
@@ -21,6 +81,8 @@ class CorpusAPICategories:
             "Content-Type": "application/json",
             "accept": "application/json"
         }
+        if include_auth:
+            api_auth.ensure_fresh_token()
         if include_auth and api_auth.access_token:
             headers["Authorization"] = f"Bearer {api_auth.access_token}"
         return headers
@@ -32,7 +94,8 @@ class CorpusAPICategories:
         
         try:
             if method.upper() == "GET":
-                response = self.session.get(url, headers=headers)
+                response = coalesced_get(self.session, url, headers=headers,
+                                         auth=api_auth if include_auth else None)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
             
@@ -53,6 +116,92 @@ class CorpusAPICategories:
             return result
         return []
 
+    def _revalidate_categories(self) -> Optional[List[Dict[str, Any]]]:
+        """Fetch categories with If-None-Match; returns None if the request failed"""
+        url = f"{self.base_url}/categories/"
+        headers = self._get_headers()
+        if self._etag and self._categories is not None:
+            headers["If-None-Match"] = self._etag
+
+        try:
+            response = coalesced_get(self.session, url, headers=headers, auth=api_auth)
+            if response.status_code == 304:
+                return self._categories
+            response.raise_for_status()
+            result = response.json()
+        except requests.exceptions.RequestException as e:
+            st.error(f"API request failed: {str(e)}")
+            return None
+        except json.JSONDecodeError as e:
+            st.error(f"Invalid JSON response: {str(e)}")
+            return None
+
+        self._etag = response.headers.get("ETag")
+        return result if isinstance(result, list) else []
+
+    def get_categories_cached(self) -> List[Dict[str, Any]]:
+        """Get all categories through the process-wide TTL cache
+
+        Expired entries are revalidated with the last ETag. Only one thread
+        fetches at a time; concurrent callers wait for its result, and a
+        failed refresh keeps serving the previous list.
+        """
+        with self._cache_lock:
+            fresh = time.monotonic() - self._fetched_at < self.cache_ttl
+            if self._categories is not None and fresh:
+                return self._categories
+            inflight = self._inflight
+            if inflight is None:
+                self._inflight = threading.Event()
+
+        if inflight is not None:
+            inflight.wait(CATEGORIES_FETCH_WAIT)
+            return self._categories or []
+
+        try:
+            categories = self._revalidate_categories()
+            with self._cache_lock:
+                if categories is not None:
+                    if categories is not self._categories:
+                        self._index = CategoryIndex(categories)
+                    self._categories = categories
+                    self._fetched_at = time.monotonic()
+                return self._categories or []
+        finally:
+            with self._cache_lock:
+                self._inflight.set()
+                self._inflight = None
+
+    def get_category_index(self) -> CategoryIndex:
+        """Get the lookup index of the current cached category snapshot
+
+        The index is only rebuilt when a fetch returns a new list, not on
+        cache hits or 304 revalidations.
+        """
+        self.get_categories_cached()
+        return self._index
+
+    def invalidate_categories_cache(self):
+        """Force the next cached read to revalidate with the API"""
+        with self._cache_lock:
+            self._fetched_at = 0.0
+
+    def is_categories_cache_fresh(self) -> bool:
+        """Check whether a cached read would be served without a request"""
+        with self._cache_lock:
+            return (self._categories is not None
+                    and time.monotonic() - self._fetched_at < self.cache_ttl)
+
+    def prime_categories(self, categories: List[Dict[str, Any]]):
+        """Store a category list fetched elsewhere, e.g. by the async client"""
+        with self._cache_lock:
+            if categories != self._categories:
+                self._index = CategoryIndex(categories)
+                self._categories = categories
+                # The list came without an ETag, so the next refresh is a full fetch
+                self._etag = None
+            self._fetched_at = time.monotonic()
+
 
 # Global API categories instance
 api_categories = CorpusAPICategories()
@@ -64,55 +213,43 @@ def get_categories_cached() -> List[Dict[str, Any]]:
         return []
     
     try:
-        return api_categories.get_categories()
+        return api_categories.get_categories_cached()
     except Exception as e:
         st.error(f"Failed to fetch categories: {str(e)}")
         return []
 
 
-def get_published_categories() -> List[Dict[str, Any]]:
+def get_category_index() -> CategoryIndex:
+    """Get the lookup index of the cached categories"""
+    if not api_auth.is_authenticated():
+        return EMPTY_CATEGORY_INDEX
+    
+    try:
+        return api_categories.get_category_index()
+    except Exception as e:
+        st.error(f"Failed to fetch categories: {str(e)}")
+        return EMPTY_CATEGORY_INDEX
+
+
+def get_published_categories() -> Tuple[Mapping[str, Any], ...]:
     """Get only published categories"""
-    categories = get_categories_cached()
-    return [cat for cat in categories if cat.get("published", False)]
+    return get_category_index().published
 
 
 def get_category_by_id(category_id: str) -> Optional[Dict[str, Any]]:
-    """Get a specific category by ID from the cached list"""
-    if not api_auth.is_authenticated():
-        return None
-    
-    categories = get_categories_cached()
-    for category in categories:
-        if category.get("id") == category_id:
-            return category
-    return None
+    """Get a copy of a specific category by ID from the cached list"""
+    category = get_category_index().by_id.get(category_id)
+    return dict(category) if category is not None else None
 
 
-def get_default_category() -> Optional[Dict[str, Any]]:
+def get_default_category() -> Optional[Mapping[str, Any]]:
     """Get a default category for dialect records"""
-    categories = get_published_categories()
-    
-    # Look for a default dialect category
-    for category in categories:
-        if "dialect" in category.get("name", "").lower() or "language" in category.get("name", "").lower():
-            return category
-    
-    # If no dialect category exists, return the first available category
-    if categories:
-        return categories[0]
-    
-    return None
+    return get_category_index().default_category
 
 
-def get_category_options() -> List[tuple]:
+def get_category_options() -> Tuple[Tuple[str, Optional[str]], ...]:
     """Get category options for dropdown selection"""
-    categories = get_published_categories()
-    options = [("Select a category", None)]
-    
-    for category in categories:
-        options.append((category.get("title", category.get("name", "Unknown")), category.get("id")))
-    
-    return options
+    return get_category_index().options
 
 
 def format_category_display(category: Dict[str, Any]) -> str:
@@ -129,22 +266,8 @@ def format_category_display(category: Dict[str, Any]) -> str:
 def get_category_statistics() -> Dict[str, Any]:
     """Get statistics about categories"""
     try:
-        categories = get_categories_cached()
-        
-        stats = {
-            "total_categories": len(categories),
-            "published_categories": len([c for c in categories if c.get("published", False)]),
-            "unpublished_categories": len([c for c in categories if not c.get("published", False)]),
-            "categories_by_rank": {}
-        }
-        
-        # Group by rank
-        for category in categories:
-            rank = category.get("rank", 0)
-            if rank not in stats["categories_by_rank"]:
-                stats["categories_by_rank"][rank] = 0
-            stats["categories_by_rank"][rank] += 1
-        
+        stats = dict(get_category_index().statistics)
+        stats["categories_by_rank"] = dict(stats["categories_by_rank"])
         return stats
     except Exception as e:
         st.error(f"Failed to get category statistics: {str(e)}")
@@ -0,0 +1,214 @@
+import http.cookiejar
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+# Connection pool sizing: pools kept per host and connections kept per pool
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 32
+
+# (connect, read) timeouts in seconds applied to every request without its own
+DEFAULT_TIMEOUT = (3.05, 20)
+
+# Retries for idempotent requests on connection errors and these statuses
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_BACKOFF_JITTER = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies DEFAULT_TIMEOUT when a request sets none"""
+
+    def __init__(self, *args: Any, timeout=DEFAULT_TIMEOUT, **kwargs: Any):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def _build_retry() -> Retry:
+    options = dict(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        return Retry(backoff_jitter=RETRY_BACKOFF_JITTER, **options)
+    except TypeError:
+        # urllib3 < 2 has no backoff_jitter
+        return Retry(**options)
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=_build_retry(),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Brotli is advertised by urllib3 whenever a brotli package is installed
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    session.headers["Connection"] = "keep-alive"
+    # Users authenticate with bearer tokens; never let one user's cookies leak to another
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Get the process-wide HTTP session shared by every API client"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _build_session()
+        return _session
+
+
+class _Call:
+    """An in-flight call whose result is shared with every waiter"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and receive the same result (or exception). Nothing
+    is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+# Shared by every API client in the process so that identical GETs from
+# different Streamlit sessions reach the upstream API only once
+_get_flight = SingleFlight()
+
+
+def send_authorized(auth: Any, send: Callable[[Dict[str, str]], requests.Response],
+                    headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Send a request with auth's bearer token, refreshing the token once on 401
+
+    auth is the API client owning the token (a CorpusAPIAuth); send
+    receives the headers to use. A 401 for a token that is not expired
+    means it was revoked or rotated elsewhere, so the token is refreshed,
+    once for all concurrent callers, and the request is resent once.
+    """
+    def attempt():
+        token = auth.access_token
+        request_headers = dict(headers or {})
+        if token:
+            request_headers["Authorization"] = f"Bearer {token}"
+        return token, send(request_headers)
+
+    token, response = attempt()
+    if response.status_code == 401 and token and auth.refresh_rejected_token(token):
+        token, response = attempt()
+    return response
+
+
+def coalesced_get(session: requests.Session, url: str, headers: Optional[Dict[str, str]] = None,
+                  auth: Any = None, **kwargs: Any) -> requests.Response:
+    """GET url, sharing the response with concurrent identical requests
+
+    Requests only coalesce when the URL, query parameters and all headers,
+    including the Authorization header, match, so different users never
+    share a response. Callers must treat the response as read-only. With
+    auth, the request carries auth's token and is retried once after a
+    401, as in send_authorized.
+    """
+    if auth is not None:
+        return send_authorized(
+            auth, lambda request_headers: coalesced_get(session, url, request_headers, **kwargs), headers
+        )
+    headers = headers or {}
+    params = kwargs.get("params") or {}
+    key = (
+        url,
+        tuple(sorted(params.items())) if isinstance(params, dict) else params,
+        tuple(sorted(headers.items())),
+    )
+    return _get_flight.do(key, lambda: session.get(url, headers=headers, **kwargs))
+
+
+def get_flight_stats() -> Dict[str, int]:
+    """Get how many GETs were executed upstream and how many were coalesced"""
+    return {"executions": _get_flight.executions, "coalesced": _get_flight.coalesced}
+
+
+def get_pool_stats() -> Dict[str, int]:
+    """Get connection pool metrics of the shared session
+
+    reused_connections counts requests that were served on an already open
+    keep-alive connection instead of a new one.
+    """
+    stats = {"pools": 0, "connections_opened": 0, "requests": 0, "reused_connections": 0}
+    if _session is None:
+        return stats
+
+    seen = set()
+    for adapter in _session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["pools"] += 1
+            stats["connections_opened"] += pool.num_connections
+            stats["requests"] += pool.num_requests
+    stats["reused_connections"] = max(stats["requests"] - stats["connections_opened"], 0)
+    return stats
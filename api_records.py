@@ -1,35 +1,268 @@
+import os
 from flask import jsonify, request, abort
 from .database import db, app, Record
 import base64
 from .models import Record
+from sqlalchemy import Integer, cast, inspect, literal_column
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.schema import CreateIndex
+from .record_batches import BatchError, RECORD_FIELDS, chunked, parse_rows, validate_row, validate_rows
+from .geo_index import bbox_around, within_radius
+from .record_queries import (
+    DEFAULT_NEARBY_RADIUS_KM, LATITUDE_BANDS_PER_DEGREE, MAX_NEARBY_RADIUS_KM, QueryError,
+    decode_cursor, encode_cursor, latitude_bands, parse_bbox, parse_fields, parse_float, parse_limit,
+)
+from .record_uploads import UploadError, UploadSessions, store_stream
 
 def initialize_routes():
-    app.add_url_rule("/api/v1/records/", view_func=create_record, methods=["POST"])
-    app.add_url_rule("/api/v1/records/<record_id>", view_func=get_record, methods=["GET", "PUT", "DELETE"])
+    app.add_url_rule("/api/v1/records/", view_func=records_api.create_record, methods=["POST"])
+    app.add_url_rule("/api/v1/records/", view_func=records_api.list_records, methods=["GET"],
+                     endpoint="list_records")
+    app.add_url_rule("/api/v1/records/<record_id>", view_func=records_api.get_record, methods=["GET"])
+    app.add_url_rule("/api/v1/records/<record_id>", view_func=records_api.update_record, methods=["PUT"],
+                     endpoint="update_record")
+    app.add_url_rule("/api/v1/records/<record_id>", view_func=records_api.delete_record, methods=["DELETE"],
+                     endpoint="delete_record")
+    app.add_url_rule("/api/v1/records/bulk", view_func=records_api.bulk_records, methods=["POST"])
+    app.add_url_rule("/api/v1/records/nearby", view_func=records_api.nearby_records, methods=["GET"])
+    app.add_url_rule("/api/v1/records/uploads", view_func=records_api.create_upload, methods=["POST"])
+    app.add_url_rule("/api/v1/records/uploads/<upload_id>", view_func=records_api.get_upload, methods=["GET"])
+    app.add_url_rule("/api/v1/records/uploads/<upload_id>", view_func=records_api.abort_upload,
+                     methods=["DELETE"], endpoint="abort_upload")
+    app.add_url_rule("/api/v1/records/uploads/<upload_id>/chunks/<int:index>",
+                     view_func=records_api.put_chunk, methods=["PUT"])
+    app.add_url_rule("/api/v1/records/uploads/<upload_id>/finalize",
+                     view_func=records_api.finalize_upload, methods=["POST"])
+    app.register_error_handler(UploadError, client_error)
+    app.register_error_handler(BatchError, client_error)
+    app.register_error_handler(QueryError, client_error)
+    ensure_record_indexes()
+
+
+def client_error(error):
+    """Report an UploadError, BatchError or QueryError with its message and status"""
+    return jsonify({"error": str(error)}), error.status
+
+# Reported for every row of a bulk chunk the database rejected; details are logged
+BULK_CHUNK_ERROR = "The database rejected this row's chunk; no row of the chunk was written"
+
+# Record fields a client may set alongside an uploaded file
+UPLOAD_RECORD_FIELDS = RECORD_FIELDS
+
+# Latitude band of a record; the nearby search filters on this exact expression so
+# the database matches it against the expression index below; the factor is a
+# literal because a bound parameter would not match the indexed expression
+LATITUDE_BAND = cast(Record.latitude * literal_column(str(LATITUDE_BANDS_PER_DEGREE)), Integer)
+
+# Filters of the list endpoint; each index ends in id so the keyset ORDER BY id
+# continues inside the index range instead of sorting the matches
+RECORD_INDEXES = [
+    db.Index("ix_records_category_id_id", Record.category_id, Record.id),
+    db.Index("ix_records_language_id", Record.language, Record.id),
+    db.Index("ix_records_user_id_id", Record.user_id, Record.id),
+    db.Index("ix_records_latitude_longitude", Record.latitude, Record.longitude),
+    # Nearby search: one seek per latitude band, then a longitude range inside it
+    db.Index("ix_records_latitude_band_longitude", LATITUDE_BAND, Record.longitude, Record.latitude),
+]
+
+
+def ensure_record_indexes():
+    """Create the list endpoint's indexes on databases created before they existed
+
+    A records table created later by create_all gets them with the table.
+    IF NOT EXISTS is left to the database, since reflection does not report
+    expression indexes on every backend.
+    """
+    with app.app_context():
+        if not inspect(db.engine).has_table(Record.__table__.name):
+            return
+        with db.engine.begin() as connection:
+            for index in RECORD_INDEXES:
+                connection.execute(CreateIndex(index, if_not_exists=True))
 
 class CorpusAPIRecords:
     def __init__(self):
-        pass
+        self._uploads = None
+
+    @property
+    def uploads(self):
+        """Upload sessions, created on first use rather than at import"""
+        if self._uploads is None:
+            self._uploads = UploadSessions()
+        return self._uploads
 
     def create_record(self):
-        data = request.form
-        record = Record(
-            title=data.get("title"),
-            description=data.get("description"),
-            media_type=data.get("media_type"),
-            filename=data.get("filename"),
-            chunk_data=data.get("chunk_data"),
-            total_chunks=int(data.get("total_chunks")),
-            latitude=float(data.get("latitude")),
-            longitude=float(data.get("longitude")),
-            category_id=data.get("category_id"),
-            user_id=data.get("user_id"),
-            release_rights=data.get("release_rights"),
-            language=data.get("language")
+        """Create a record with its media file
+
+        Accepts a raw application/octet-stream body with the record fields
+        in the query string, or multipart/form-data with the file in the
+        "file" part. Either way the file is streamed to storage and hashed
+        in fixed-size buffers. Forms with base64 chunk_data are still
+        accepted from older clients. The record fields are validated before
+        anything is written to storage.
+        """
+        if request.mimetype == "application/octet-stream":
+            fields = self._record_fields(request.args)
+            filename = request.args.get("filename") or "upload"
+            stored = store_stream(request.stream, filename, self.uploads.media_dir)
+        elif "file" in request.files:
+            fields = self._record_fields(request.form)
+            upload = request.files["file"]
+            filename = request.form.get("filename") or upload.filename
+            stored = store_stream(upload.stream, filename, self.uploads.media_dir)
+        else:
+            data = request.form
+            record = Record(
+                title=data.get("title"),
+                description=data.get("description"),
+                media_type=data.get("media_type"),
+                filename=data.get("filename"),
+                chunk_data=data.get("chunk_data"),
+                total_chunks=int(data.get("total_chunks")),
+                latitude=float(data.get("latitude")),
+                longitude=float(data.get("longitude")),
+                category_id=data.get("category_id"),
+                user_id=data.get("user_id"),
+                release_rights=data.get("release_rights"),
+                language=data.get("language")
+            )
+            db.session.add(record)
+            db.session.commit()
+            return jsonify({"message": "Record created successfully", "record_id": record.id})
+
+        try:
+            record = self._new_record(fields, stored["stored_name"], total_chunks=1)
+            db.session.add(record)
+            db.session.commit()
+        except BaseException:
+            # No record points at the stored file, so it would never be cleaned up
+            db.session.rollback()
+            os.remove(stored["path"])
+            raise
+        return jsonify({
+            "message": "Record created successfully",
+            "record_id": record.id,
+            "size": stored["size"],
+            "sha256": stored["sha256"],
+        }), 201
+
+    def list_records(self):
+        """List records with keyset pagination, filters and sparse fields
+
+        Query parameters: category_id, language, user_id, bbox
+        (south,west,north,east), fields (comma separated), limit and
+        cursor. Pages are ordered by id and continue after the cursor's id,
+        so each page is an index range scan no matter how deep the client
+        pages, unlike OFFSET.
+        """
+        args = request.args
+        limit = parse_limit(args.get("limit"))
+        after_id = decode_cursor(args.get("cursor"))
+        fields = parse_fields(args.get("fields"), Record.__table__.columns.keys())
+
+        query = Record.query
+        for name in ("category_id", "language", "user_id"):
+            if args.get(name):
+                query = query.filter(getattr(Record, name) == args[name])
+        bbox = parse_bbox(args.get("bbox"))
+        if bbox:
+            south, west, north, east = bbox
+            query = query.filter(
+                Record.latitude.between(south, north),
+                Record.longitude.between(west, east),
+            )
+        if after_id is not None:
+            query = query.filter(Record.id > after_id)
+        if fields:
+            query = query.with_entities(*[getattr(Record, name) for name in fields])
+
+        # One extra row tells whether another page exists without a COUNT
+        rows = query.order_by(Record.id).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if fields:
+            records = [dict(zip(fields, row)) for row in rows]
+        else:
+            records = [record.to_dict() for record in rows]
+
+        return jsonify({
+            "records": records,
+            "next_cursor": encode_cursor(rows[-1].id) if has_more else None,
+        })
+
+    def nearby_records(self):
+        """Find records within radius_km of lat/lon, nearest first
+
+        A bounding box around the circle is matched first. Its latitude range
+        is given only as the IN list of latitude bands it covers, so the
+        (band, longitude, latitude) index seeks each band and scans only the
+        longitude range inside it, reading id and coordinates from the index
+        alone. The candidates are then refined with an exact haversine
+        distance, and only the nearest limit records are loaded.
+        """
+        args = request.args
+        lat = parse_float(args.get("lat"), "lat", -90.0, 90.0)
+        lon = parse_float(args.get("lon"), "lon", -180.0, 180.0)
+        radius_km = parse_float(
+            args.get("radius_km", DEFAULT_NEARBY_RADIUS_KM), "radius_km", 0.0, MAX_NEARBY_RADIUS_KM
+        )
+        limit = parse_limit(args.get("limit"))
+        fields = parse_fields(args.get("fields"), Record.__table__.columns.keys())
+
+        south, west, north, east = bbox_around(lat, lon, radius_km)
+        candidates = db.session.query(Record.id, Record.latitude, Record.longitude).filter(
+            LATITUDE_BAND.in_(latitude_bands(south, north)),
+            Record.longitude.between(west, east),
+        )
+        nearest = within_radius(candidates, lat, lon, radius_km, limit)
+        if not nearest:
+            return jsonify({"records": []})
+
+        query = Record.query.filter(Record.id.in_([record_id for record_id, _ in nearest]))
+        if fields:
+            query = query.with_entities(*[getattr(Record, name) for name in fields])
+            by_id = {row.id: dict(zip(fields, row)) for row in query}
+        else:
+            by_id = {record.id: record.to_dict() for record in query}
+
+        records = []
+        for record_id, distance_km in nearest:
+            record = by_id.get(record_id)
+            if record is not None:
+                record["distance_km"] = round(distance_km, 3)
+                records.append(record)
+        return jsonify({"records": records})
+
+    def _record_fields(self, data):
+        """Get the validated record fields sent with a media file; raises UploadError"""
+        metadata = {field: data[field] for field in UPLOAD_RECORD_FIELDS if field in data}
+        checked, error = validate_row(dict(metadata, op="create"))
+        if error:
+            raise UploadError(error)
+        return checked["fields"]
+
+    def _new_record(self, fields, stored_name, total_chunks):
+        """Build a Record for a stored media file from client supplied fields"""
+        def coordinate(name):
+            value = fields.get(name)
+            try:
+                return float(value) if value is not None else None
+            except (TypeError, ValueError):
+                raise UploadError(f"{name} must be a number")
+
+        return Record(
+            title=fields.get("title"),
+            description=fields.get("description"),
+            media_type=fields.get("media_type"),
+            filename=stored_name,
+            total_chunks=total_chunks,
+            latitude=coordinate("latitude"),
+            longitude=coordinate("longitude"),
+            category_id=fields.get("category_id"),
+            user_id=fields.get("user_id"),
+            release_rights=fields.get("release_rights"),
+            language=fields.get("language")
         )
-        db.session.add(record)
-        db.session.commit()
-        return jsonify({"message": "Record created successfully", "record_id": record.id})
 
     def get_record(self, record_id):
         record = Record.query.get(record_id)
@@ -57,8 +290,133 @@ class CorpusAPIRecords:
         db.session.commit()
         return jsonify({"message": "Record deleted successfully"})
 
+    def create_upload(self):
+        """Open a resumable upload session for a record's media file
+
+        Chunks of chunk_size bytes are then PUT in any order, missing ones
+        are listed by GET on the session, and finalize creates the Record.
+        """
+        data = request.get_json(force=True)
+        try:
+            total_size = int(data["total_size"])
+            chunk_size = int(data["chunk_size"]) if data.get("chunk_size") else None
+        except (KeyError, TypeError, ValueError):
+            raise UploadError("total_size is required and chunk_size must be an integer")
+        # Reject bad record fields now, not after the whole file was uploaded
+        metadata = self._record_fields(data)
+        status = self.uploads.create(
+            data.get("filename"), total_size, chunk_size, data.get("sha256"), metadata
+        )
+        return jsonify(status), 201
+
+    def get_upload(self, upload_id):
+        return jsonify(self.uploads.status(upload_id))
+
+    def put_chunk(self, upload_id, index):
+        """Stream one chunk body to the spool file; X-Chunk-SHA256 is checked when sent"""
+        status = self.uploads.write_chunk(
+            upload_id, index, request.stream, request.headers.get("X-Chunk-SHA256")
+        )
+        return jsonify(status)
+
+    def abort_upload(self, upload_id):
+        self.uploads.abort(upload_id)
+        return jsonify({"message": "Upload discarded"})
+
+    def finalize_upload(self, upload_id):
+        """Create the Record for a complete upload
+
+        The session is only removed once the record is committed; if that
+        fails the file goes back to the spool and finalize can be retried.
+        """
+        upload = self.uploads.finalize(upload_id)
+        try:
+            record = self._new_record(upload["metadata"], upload["stored_name"], upload["total_chunks"])
+            db.session.add(record)
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            self.uploads.release(upload_id)
+            raise
+        self.uploads.complete(upload_id)
+        return jsonify({
+            "message": "Record created successfully",
+            "record_id": record.id,
+            "sha256": upload["sha256"],
+        }), 201
+
+    def bulk_records(self):
+        """Create, update or delete many records in chunked transactions
+
+        The body is NDJSON (one row per line) or a JSON array of rows. Each
+        row has an optional "op" (create, update or delete, inferred from
+        "id" when missing), an "id" for updates and deletes, and record
+        fields. All rows are validated before anything is written; if any
+        row is invalid the batch is rejected with the per-row errors. Valid
+        batches are written BULK_CHUNK_SIZE rows per transaction with one
+        commit each, and a failing chunk is rolled back without affecting
+        the others.
+        """
+        rows = parse_rows(request.stream, request.mimetype)
+        valid, errors = validate_rows(rows)
+        if errors:
+            return jsonify({"message": "Batch rejected; no rows were written", "results": errors}), 422
+
+        results = []
+        for chunk in chunked(valid):
+            try:
+                chunk_results = self._write_bulk_chunk(chunk)
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                # The exception carries SQL and parameters; keep it in the server log
+                app.logger.exception("Bulk chunk of rows %d-%d failed", chunk[0]["index"], chunk[-1]["index"])
+                chunk_results = [
+                    {"index": row["index"], "status": "error", "error": BULK_CHUNK_ERROR}
+                    for row in chunk
+                ]
+            results.extend(chunk_results)
+
+        counts = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        status_code = 200 if "error" not in counts else 207
+        return jsonify({"counts": counts, "results": results}), status_code
+
+    def _write_bulk_chunk(self, chunk):
+        """Stage one chunk in the session: one SELECT for its ids, one flush for its inserts"""
+        ids = [row["id"] for row in chunk if row["op"] != "create"]
+        existing = {}
+        if ids:
+            existing = {str(record.id): record for record in Record.query.filter(Record.id.in_(ids))}
+
+        results, created = [], []
+        for row in chunk:
+            result = {"index": row["index"], "id": row["id"]}
+            if row["op"] == "create":
+                record = Record(**row["fields"])
+                db.session.add(record)
+                created.append((result, record))
+                result["status"] = "created"
+            else:
+                record = existing.get(str(row["id"]))
+                if record is None:
+                    result.update(status="error", error="Record not found")
+                elif row["op"] == "delete":
+                    db.session.delete(record)
+                    result["status"] = "deleted"
+                else:
+                    for name, value in row["fields"].items():
+                        setattr(record, name, value)
+                    result["status"] = "updated"
+            results.append(result)
+
+        # Inserts of the chunk go out together and receive their ids here
+        db.session.flush()
+        for result, record in created:
+            result["id"] = record.id
+        return results
+
+
+records_api = CorpusAPIRecords()
 
-def __initRoutes__():
-    app.add_url_rule("/api/v1/records/", view_func=lambda: jsonify({"message": "Records API"}))
-    app.add_url_rule("/api/v1/records/<record_id>/", view_func=lambda: jsonify({"message": "Record details"}))
-    app.add_url_rule("/api/v1/records/", view_func=lambda: jsonify({"message": "List of records"}))
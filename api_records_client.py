@@ -0,0 +1,238 @@
+import requests
+import streamlit as st
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterator, List, Sequence
+from urllib.parse import urljoin
+from api_auth import API_BASE_URL, API_VERSION, api_auth, get_api_auth
+from api_http import coalesced_get, get_session, send_authorized
+
+# Records requested per page while iterating
+RECORDS_PAGE_SIZE = 200
+
+
+class CorpusAPIRecordsClient:
+    """Records client for Indic Corpus Collections API"""
+
+    def __init__(self, page_size: int = RECORDS_PAGE_SIZE):
+        self.base_url = f"{API_BASE_URL}/api/{API_VERSION}"
+        self.session = get_session()
+        self.page_size = page_size
+
+    def _get_headers(self, include_auth: bool = True, auth=None) -> Dict[str, str]:
+        """Get request headers
+
+        auth defaults to the calling session's client; worker threads have
+        no session and must pass the client captured by their caller.
+        """
+        auth = auth or api_auth
+        headers = {
+            "Content-Type": "application/json",
+            "accept": "application/json"
+        }
+        if include_auth:
+            auth.ensure_fresh_token()
+        if include_auth and auth.access_token:
+            headers["Authorization"] = f"Bearer {auth.access_token}"
+        return headers
+
+    def _fetch_page(self, headers: Dict[str, str], params: Dict[str, Any],
+                    auth=None) -> List[Dict[str, Any]]:
+        """Fetch one page of records; raises on request errors"""
+        response = coalesced_get(self.session, f"{self.base_url}/records/",
+                                 headers=headers, auth=auth, params=params)
+        response.raise_for_status()
+        result = response.json()
+        return result if isinstance(result, list) else []
+
+    def iter_records(self, page_size: Optional[int] = None, limit: Optional[int] = None,
+                     **filters: Any) -> Iterator[Dict[str, Any]]:
+        """Iterate over records page by page
+
+        While the caller consumes one page the next one is already being
+        fetched, so at most two pages are held in memory. Filters such as
+        user_id or category_id are passed through as query parameters.
+        Iteration stops at the first short page or after limit records. A
+        request error on any page is raised, so a caller never mistakes
+        the records yielded so far for the complete result.
+        """
+        page_size = page_size or self.page_size
+        params = {key: value for key, value in filters.items() if value is not None}
+        # The client is resolved here, on the calling thread, which owns the session's token
+        auth = get_api_auth()
+        headers = self._get_headers(auth=auth)
+
+        def page_params(skip: int) -> Dict[str, Any]:
+            size = page_size if limit is None else min(page_size, limit - skip)
+            return dict(params, skip=skip, limit=size)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            request_params = page_params(0)
+            future = executor.submit(self._fetch_page, headers, request_params, auth)
+            while future is not None:
+                page = future.result()
+                skip = request_params["skip"] + len(page)
+                future = None
+                if len(page) == request_params["limit"] and (limit is None or skip < limit):
+                    request_params = page_params(skip)
+                    future = executor.submit(self._fetch_page, headers, request_params, auth)
+
+                yield from page
+
+    def get_records(self, limit: int = 100, **filters: Any) -> List[Dict[str, Any]]:
+        """Get up to limit records; raises on request errors"""
+        return list(self.iter_records(limit=limit, **filters))
+
+    def get_record(self, record_id: str, auth=None) -> Dict[str, Any]:
+        """Get one record; raises on request errors"""
+        response = coalesced_get(self.session, f"{self.base_url}/records/{record_id}",
+                                 headers=self._get_headers(auth=auth), auth=auth or api_auth)
+        response.raise_for_status()
+        return response.json()
+
+    def get_media(self, record_id: str, auth=None) -> Optional[bytes]:
+        """Get the media file of a record, or None if it has none; raises on request errors"""
+        file_url = self.get_record(record_id, auth=auth).get("file_url")
+        if not file_url:
+            return None
+        headers = self._get_headers(auth=auth)
+        headers.pop("Content-Type")
+        headers["accept"] = "*/*"
+        response = coalesced_get(self.session, urljoin(f"{self.base_url}/", file_url),
+                                 headers=headers, auth=auth or api_auth)
+        response.raise_for_status()
+        return response.content
+
+    def create_record(self, fields: Dict[str, Any], filename: str, data: bytes,
+                      auth=None) -> Dict[str, Any]:
+        """Create a record with its media file in one multipart request; raises on request errors"""
+        headers = self._get_headers(auth=auth)
+        # requests sets the multipart Content-Type with its boundary
+        headers.pop("Content-Type")
+        form = {key: value for key, value in fields.items() if value is not None}
+        response = send_authorized(
+            auth or api_auth,
+            lambda request_headers: self.session.post(f"{self.base_url}/records/", headers=request_headers,
+                                                      data=form, files={"file": (filename, data)}),
+            headers,
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+def to_map_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an API record into the flat shape used by the map and filters"""
+    location = record.get("location") or {}
+    return {
+        "id": record.get("uid") or record.get("id"),
+        "dialect_word": record.get("title", ""),
+        "location_text": record.get("location_text") or record.get("description", ""),
+        "latitude": location.get("latitude", record.get("latitude")),
+        "longitude": location.get("longitude", record.get("longitude")),
+        "state": record.get("state"),
+        "category_id": record.get("category_id"),
+        "image_path": record.get("file_url"),
+        "is_verified": record.get("reviewed", False),
+        "user_id": record.get("user_id"),
+        "created_at": record.get("created_at"),
+        "updated_at": record.get("updated_at"),
+        "is_deleted": bool(record.get("is_deleted") or record.get("deleted_at")),
+    }
+
+
+# Global API records instance
+api_records = CorpusAPIRecordsClient()
+
+
+def iter_records_for_map(page_size: Optional[int] = None, **filters: Any) -> Iterator[Dict[str, Any]]:
+    """Stream records with coordinates, and deletion tombstones, in map shape
+
+    Raises on request errors, like iter_records.
+    """
+    if not api_auth.is_authenticated():
+        return
+    for record in api_records.iter_records(page_size=page_size, **filters):
+        map_record = to_map_record(record)
+        has_coordinates = map_record["latitude"] is not None and map_record["longitude"] is not None
+        if has_coordinates or map_record["is_deleted"]:
+            yield map_record
+
+
+def iter_records_changed_since(cursor: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """Stream map records changed at or after cursor, or all records if it is None
+
+    updated_since is not in the published API reference. A server that
+    ignores it returns every record; RecordStore notices the records older
+    than the cursor and switches to full reloads.
+    """
+    if not api_auth.is_authenticated():
+        raise PermissionError("Records sync requires an authenticated session")
+    return iter_records_for_map(updated_since=cursor)
+
+
+def get_records_for_map() -> List[Dict[str, Any]]:
+    """Get all records with coordinates for the map"""
+    return [record for record in iter_records_for_map() if not record["is_deleted"]]
+
+
+def get_image_from_api(record_id: str, auth=None) -> Optional[bytes]:
+    """Get the image bytes of a record, or None if it has none or the request failed
+
+    Safe to call from worker threads when auth is the session's client,
+    e.g. get_api_auth() captured on the script thread.
+    """
+    try:
+        return api_records.get_media(record_id, auth=auth)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        # Usually runs on worker threads, where st.error is unavailable
+        print(f"Image fetch failed for {record_id}: {e}")
+        return None
+
+
+def add_record_to_api(dialect_word: str, location_text: str, image_data: bytes,
+                      lat: float, lon: float, category_id: Optional[str] = None,
+                      filename: str = "upload", auth=None) -> Optional[str]:
+    """Submit a dialect word with its image; returns the new record's id, or None on failure"""
+    auth = auth or api_auth
+    user_info = auth.get_user_info() or {}
+    user_id = user_info.get("user_id")
+    if not user_id:
+        # Password logins carry no user_info; use the cached profile
+        profile = auth.get_current_user_cached()
+        user_id = profile.get("id") or profile.get("user_id")
+    fields = {
+        "title": dialect_word,
+        "description": location_text,
+        "media_type": "image",
+        "latitude": lat,
+        "longitude": lon,
+        "category_id": category_id,
+        "user_id": user_id,
+        "release_rights": "creator",
+    }
+    try:
+        result = api_records.create_record(fields, filename, image_data, auth=auth)
+    except requests.exceptions.RequestException as e:
+        st.error(f"API request failed: {str(e)}")
+        return None
+    except json.JSONDecodeError as e:
+        st.error(f"Invalid JSON response: {str(e)}")
+        return None
+    return result.get("record_id") or result.get("uid") or result.get("id")
+
+
+def get_random_record(records: Optional[Sequence[Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+    """Pick a random map record from records, or from the first page of the API
+
+    Returns None when there are no records or the page could not be fetched.
+    """
+    if records is None:
+        try:
+            page = api_records.get_records(limit=RECORDS_PAGE_SIZE)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            st.error(f"API request failed: {str(e)}")
+            return None
+        records = [to_map_record(record) for record in page]
+        records = [record for record in records if not record["is_deleted"]]
+    return random.choice(records) if records else None
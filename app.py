@@ -1,51 +1,470 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from geopy.geocoders import Nominatim
-import io
-from PIL import Image
+import os
 import folium
 from streamlit_folium import st_folium
 from folium.plugins import HeatMap, MarkerCluster
 import base64
 import random
+import requests
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, wait
+import api_async
 import api_auth_ui
-import api_records
+import api_records_client as api_records
 import api_categories
+import geo_index
+import geocoding
+import record_filters
+import record_store
+import tagged_cache
+import thumbnails
+
+
+# Popup images are either served as static files and loaded by the browser
+# when a popup opens ("url"), or base64-inlined into the map HTML ("inline").
+POPUP_IMAGE_MODE = "url"
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+THUMBNAIL_DIR = os.path.join(STATIC_DIR, "thumbnails")
+# Maps record ids to thumbnail files; kept out of STATIC_DIR, which is served publicly
+THUMBNAIL_ALIAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thumbnail_aliases.tsv")
+
+# Initial map view and the (south, west, north, east) box it roughly covers
+MAP_CENTER = [20.5937, 78.9629]
+MAP_ZOOM = 5
+MAP_BOUNDS = (6.0, 68.0, 37.5, 97.5)
+# Below this zoom, or above this many markers in view, markers are pre-clustered
+CLUSTER_BELOW_ZOOM = 9
+MAX_VIEWPORT_MARKERS = 500
+# Seconds between incremental syncs that pick up other users' submissions
+RECORDS_CACHE_TTL = 120
+
+
+DEMO_RECORDS = [
+    {
+        "id": "demo_1",
+        "dialect_word": "Baingan",
+        "location_text": "Hyderabad, Telangana",
+        "latitude": 17.3850,
+        "longitude": 78.4867,
+        "image_path": None,
+        "is_verified": True,
+        "user_id": "demo_user",
+        "created_at": "2025-01-01T00:00:00Z"
+    },
+    {
+        "id": "demo_2", 
+        "dialect_word": "Cycle",
+        "location_text": "Mumbai, Maharashtra",
+        "latitude": 19.0760,
+        "longitude": 72.8777,
+        "image_path": None,
+        "is_verified": True,
+        "user_id": "demo_user",
+        "created_at": "2025-01-01T00:00:00Z"
+    }
+]
 
 
 # --- Caching ---
 @st.cache_resource
-def get_geolocator():
-    """Get a cached geolocator object."""
-    return Nominatim(user_agent="dialect_map_app")
+def get_geocoder():
+    """Get the process-wide geocoder backed by the gazetteer and the persistent cache."""
+    return geocoding.Geocoder()
 
 
-@st.cache_data
 def geocode_location(location_name):
     """Geocode a location name to get latitude and longitude."""
-    geolocator = get_geolocator()
+    return get_geocoder().geocode(location_name)
+
+
+@st.cache_resource
+def get_state_resolver():
+    """Get the process-wide coordinates to state resolver."""
+    return geocoding.StateResolver(get_geocoder().gazetteer)
+
+
+def resolve_state(lat, lon):
+    """Resolve coordinates to a state name, or None outside the known area."""
+    return get_state_resolver().resolve(lat, lon)["state"]
+
+
+@st.cache_resource
+def get_app_cache():
+    """Get the process-wide tagged cache for record lists and derived data."""
+    return tagged_cache.TaggedCache()
+
+
+@st.cache_resource
+def get_record_store():
+    """Get the process-wide local copy of the API records."""
+    return record_store.RecordStore()
+
+
+def sync_records():
+    """Pull records changed since the last sync and patch the derived caches.
+
+    Runs at most once per RECORDS_CACHE_TTL. New records are appended to
+    the cached stats and filter index in place; updates and deletes drop
+    the record-derived entries so they are rebuilt from the store. Until
+    the first sync succeeds its errors are raised, so callers fall back to
+    demo data instead of caching an empty record set; later failures keep
+    serving the last synced records.
+    """
+    if not api_auth_ui.api_auth.is_authenticated():
+        return
+    store = get_record_store()
     try:
-        location = geolocator.geocode(location_name, country_codes="IN")
-        if location:
-            return location.latitude, location.longitude
+        changes = store.sync_if_due(
+            api_records.iter_records_changed_since, RECORDS_CACHE_TTL
+        )
     except Exception as e:
-        print(f"Geocoding error: {e}")
-    return None, None
+        if not store.loaded:
+            raise
+        print(f"Record sync failed: {e}")
+        return
+    if not changes:
+        return
+
+    if changes["updated"] or changes["removed"]:
+        get_app_cache().invalidate("records")
+        get_density_grids.clear()
+    else:
+        for record in changes["added"]:
+            update_record_caches(record)
 
 
-def get_image_format(image_data):
-    """Determine the image format from its raw data."""
-    try:
-        if not image_data:
-            return "png"
-        image = Image.open(io.BytesIO(image_data))
-        if image.format:
-            return image.format.lower()
+def get_map_records():
+    """Get all records for the map from the local record store.
+
+    Raises if the records could never be loaded from the API.
+    """
+    sync_records()
+    return get_record_store().records
+
+
+def get_record_stats():
+    """Get the contribution count and the set of mapped locations."""
+    def load_stats():
+        records = get_map_records()
+        return {
+            "total": len(records),
+            "locations": {record.get("location_text", "") for record in records},
+        }
+
+    return get_app_cache().get_or_load(
+        "stats:map", load_stats, tags=("records",)
+    )
+
+
+def get_records_csv():
+    """Get the CSV export of all records."""
+    return get_app_cache().get_or_load(
+        "export:csv",
+        lambda: pd.DataFrame(get_map_records()).to_csv(index=False).encode("utf-8"),
+        tags=("records",),
+    )
+
+
+def get_filter_index():
+    """Get the search, state and category index over the cached records."""
+    return get_app_cache().get_or_load(
+        "index:filters",
+        lambda: record_filters.RecordFilterIndex(get_map_records(), resolve_state),
+        tags=("records",),
+    )
+
+
+def add_record_to_cache(record):
+    """Add a newly submitted record to the record store and derived caches."""
+    get_record_store().add(record)
+    update_record_caches(record)
+
+
+def update_record_caches(record):
+    """Patch the cached stats and filter index in place for one new record.
+
+    Other record-derived entries, such as the CSV export, are dropped and
+    rebuilt on next use. Geocodes and categories are left untouched.
+    """
+    def update_stats(stats):
+        stats["total"] += 1
+        stats["locations"].add(record.get("location_text", ""))
+        return stats
+
+    get_app_cache().update(
+        "records",
+        {
+            "stats:map": update_stats,
+            "index:filters": lambda index: index.add(record),
+        },
+    )
+
+
+@st.cache_resource
+def get_image_format_cache():
+    """Get the process-wide record id to image format cache."""
+    return thumbnails.ImageFormatCache()
+
+
+def get_image_format(image_data, record_id=None):
+    """Determine the image format from the header of its raw data."""
+    if record_id is not None:
+        image_format = get_image_format_cache().get(record_id)
+        if image_format:
+            return image_format
+
+    # Default to png if format is not identifiable
+    image_format = thumbnails.sniff_image_format(image_data) or "png"
+    if record_id is not None and image_data:
+        get_image_format_cache().set(record_id, image_format)
+    return image_format
+
+
+@st.cache_resource
+def get_thumbnail_cache():
+    """Get the process-wide thumbnail cache served from the static folder."""
+    return thumbnails.ThumbnailCache(THUMBNAIL_DIR, alias_path=THUMBNAIL_ALIAS_PATH)
+
+
+def static_url(*parts):
+    """Build the URL Streamlit serves a file under the static folder from."""
+    base_path = st.get_option("server.baseUrlPath").strip("/")
+    prefix = f"/{base_path}" if base_path else ""
+    return f"{prefix}/app/static/" + "/".join(parts)
+
+
+def get_thumbnail_files(record_ids, size_name):
+    """Return thumbnail file names for the given records, fetching only uncached images."""
+    cache = get_thumbnail_cache()
+    size = thumbnails.THUMBNAIL_SIZES[size_name]
+    files = {}
+    missing = []
+    for record_id in record_ids:
+        filename = cache.lookup(f"{record_id}:{size_name}")
+        if filename:
+            files[record_id] = filename
         else:
-            return "png"  # Default to png if format is not identifiable
-    except (IOError, TypeError, AttributeError):
-        return "png"  # Default to png if format is not identifiable
+            missing.append(record_id)
+
+    for record_id, image_data in prefetch_images(missing).items():
+        try:
+            files[record_id] = cache.get_or_create(
+                image_data, size, alias=f"{record_id}:{size_name}"
+            )
+        except (IOError, ValueError) as e:
+            print(f"Could not create thumbnail for {record_id}: {e}")
+    return files
+
+
+def prefetch_images(record_ids, max_workers=8, time_budget=5.0):
+    """Fetch images for several records concurrently within a time budget.
+
+    Returns a dict mapping record id to image bytes. Records whose image
+    could not be fetched before the budget ran out are left out, so callers
+    fall back to their "Image unavailable" rendering for them.
+    """
+    images = {}
+    record_ids = list(dict.fromkeys(record_ids))
+    if not record_ids:
+        return images
+
+    # Worker threads have no Streamlit session, so they get this session's client explicitly
+    auth = api_auth_ui.get_api_auth()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(record_ids)))
+    futures = {
+        executor.submit(api_records.get_image_from_api, record_id, auth=auth): record_id
+        for record_id in record_ids
+    }
+    done, not_done = wait(futures, timeout=time_budget)
+    for future in not_done:
+        future.cancel()
+    executor.shutdown(wait=False)
+
+    for future in done:
+        try:
+            image_data = future.result()
+        except Exception as e:
+            print(f"Image fetch error for {futures[future]}: {e}")
+            continue
+        if image_data:
+            images[futures[future]] = image_data
+    return images
+
+
+@st.cache_resource(max_entries=32)
+def get_density_grids(data_source, search_query, state_filter, category_filter):
+    """Get the heatmap density grids for one data source and combination of filters.
+
+    data_source is "api" or "demo", so demo points binned while the API
+    was down never end up in the grids of the real records.
+    """
+    return geo_index.DensityGrids()
+
+
+def get_map_viewport():
+    """Get the center, zoom and (south, west, north, east) bounds last reported by the map."""
+    map_state = st.session_state.get("dialect_map") or {}
+    zoom = map_state.get("zoom") or MAP_ZOOM
+    center = map_state.get("center") or {}
+    center = [center.get("lat", MAP_CENTER[0]), center.get("lng", MAP_CENTER[1])]
+
+    bounds = map_state.get("bounds") or {}
+    south_west = bounds.get("_southWest") or {}
+    north_east = bounds.get("_northEast") or {}
+    if south_west.get("lat") is None or north_east.get("lat") is None:
+        return center, zoom, MAP_BOUNDS
+    return center, zoom, (
+        south_west["lat"], south_west["lng"], north_east["lat"], north_east["lng"]
+    )
+
+
+def add_cluster_markers(feature_group, records, zoom):
+    """Add one count marker per server-side cluster of records."""
+    single_records = []
+    for cluster in geo_index.cluster_records(records, zoom):
+        if cluster["count"] == 1:
+            single_records.extend(cluster["records"])
+            continue
+
+        words = ", ".join(
+            dict.fromkeys(record["dialect_word"] for record in cluster["records"][:5])
+        )
+        folium.Marker(
+            location=[cluster["latitude"], cluster["longitude"]],
+            tooltip=f"{cluster['count']} submissions ({words}...) - zoom in to explore",
+            icon=folium.DivIcon(
+                html=(
+                    '<div style="background: #F63366; color: white; border-radius: 50%; '
+                    'width: 36px; height: 36px; line-height: 36px; text-align: center; '
+                    f'font-weight: bold;">{cluster["count"]}</div>'
+                ),
+                icon_size=(36, 36),
+                icon_anchor=(18, 18),
+            ),
+        ).add_to(feature_group)
+
+    if single_records:
+        add_record_markers(feature_group, single_records)
+
+
+def add_record_markers(feature_group, records):
+    """Add a marker with an image popup for each record."""
+    marker_cluster = MarkerCluster().add_to(feature_group)
+    thumbnail_cache = get_thumbnail_cache()
+    thumbnail_files = get_thumbnail_files([record["id"] for record in records], "popup")
+    for record in records:
+        thumbnail_file = thumbnail_files.get(record["id"])
+        if thumbnail_file and POPUP_IMAGE_MODE == "url":
+            image_url = static_url("thumbnails", thumbnail_file)
+            html = f'<img src="{image_url}" width="150" loading="lazy"><br><b>{record["dialect_word"]}</b>'
+        elif thumbnail_file:
+            try:
+                with open(thumbnail_cache.path(thumbnail_file), "rb") as f:
+                    image_data = f.read()
+                image_format = get_image_format(image_data, record["id"])
+                encoded = base64.b64encode(image_data).decode()
+                html = f'<img src="data:image/{image_format};base64,{encoded}" width="150"><br><b>{record["dialect_word"]}</b>'
+            except Exception:
+                html = f'<b>{record["dialect_word"]}</b><br><i>Image unavailable</i>'
+        else:
+            html = f'<b>{record["dialect_word"]}</b><br><i>Image unavailable</i>'
+
+        popup = folium.Popup(html, max_width=200)
+
+        icon = folium.DivIcon(
+            html=f'<div style="font-size: 24px;">📍</div>',
+            icon_size=(30, 30),
+            icon_anchor=(15, 30),
+        )
+
+        location_text = record.get("location_text", "Unknown Location")
+        folium.Marker(
+            location=[record["latitude"], record["longitude"]],
+            popup=popup,
+            tooltip=f"{record['dialect_word']} ({location_text})",
+            icon=icon,
+        ).add_to(marker_cluster)
+
+
+def get_current_user_id(auth, fetch_profile=True):
+    """Get the logged-in user's id from the login, else from the /auth/me profile
+
+    Password logins carry no user_info. Without fetch_profile, only a
+    cached profile is used.
+    """
+    if auth.user_info and auth.user_info.get("user_id"):
+        return auth.user_info["user_id"]
+    if not fetch_profile and not auth.has_cached_current_user():
+        return None
+    profile = auth.get_current_user_cached()
+    if "error" in profile:
+        return None
+    return profile.get("id") or profile.get("user_id")
+
+
+def prefetch_api_data(random_record_id=None):
+    """Fetch the independent API data of this render concurrently.
+
+    Stale categories and the current user's profile, the records
+    connection check, the first page of the user's records and the image
+    of the submission of the day are requested in one round with the
+    async client. Categories and the profile prime their caches; the rest
+    is returned by name for the render to use. Failed calls come back as
+    {"error": ...} and are reported here, on the script thread, by the
+    code that uses them. Without httpx this returns {} and every call falls
+    back to its own blocking request.
+    """
+    auth = api_auth_ui.get_api_auth()
+    if not api_async.is_available() or not auth.is_authenticated():
+        return {}
+
+    try:
+        results = api_async.gather_page_data(
+            auth,
+            include_categories=not api_categories.api_categories.is_categories_cache_fresh(),
+            include_current_user=not auth.has_cached_current_user(),
+            include_records=True,
+            user_id=get_current_user_id(auth, fetch_profile=False),
+            user_records_limit=api_records.api_records.page_size,
+            random_record_id=random_record_id,
+        )
+    except Exception as e:
+        print(f"Async prefetch failed: {e}")
+        return {}
+
+    categories = results.pop("categories", None)
+    if isinstance(categories, list) and categories:
+        api_categories.api_categories.prime_categories(categories)
+    current_user = results.pop("current_user", None)
+    if isinstance(current_user, dict) and "error" not in current_user:
+        auth.prime_current_user(current_user)
+    return results
+
+
+def check_records_api(page_data):
+    """Get one record to check the records API, reusing this render's prefetch
+
+    Raises when the request failed, like get_records.
+    """
+    result = page_data.get("records")
+    if result is None:
+        return api_records.api_records.get_records(limit=1)
+    if isinstance(result, dict):
+        raise requests.exceptions.RequestException(result.get("error"))
+    return result
+
+
+def get_random_record_image(page_data, record_id):
+    """Get the image of the submission of the day, reusing this render's prefetch"""
+    if "random_record_media" not in page_data:
+        return api_records.get_image_from_api(record_id)
+    media = page_data["random_record_media"]
+    if isinstance(media, dict):
+        print(f"Image fetch failed for {record_id}: {media.get('error')}")
+        return None
+    return media
 
 
 def main():
@@ -60,6 +479,22 @@ def main():
     api_auth_ui.init_session_state()
     api_auth_ui.load_auth_from_session()
 
+    # The first sync of the process raises when the API is down; the page then shows demo data
+    records_available = False
+    random_record = None
+    if api_auth_ui.api_auth.is_authenticated():
+        try:
+            get_map_records()
+            records_available = True
+        except Exception as e:
+            print(f"Could not load records: {e}")
+        random_record = api_records.get_random_record(
+            get_map_records() if records_available else DEMO_RECORDS
+        )
+    page_data = prefetch_api_data(
+        random_record.get("id") if random_record and records_available else None
+    )
+
     st.title("Desi Dialect Map 🗺️📍")
     st.markdown("A collaborative project by **Team ahjin Guild**")
     st.markdown("*Sreenidhi Institute of Science and Technology*")
@@ -70,7 +505,7 @@ def main():
     # Show demo mode indicator if API is not working
     if api_auth_ui.api_auth.is_authenticated():
         try:
-            test_records = api_records.api_records.get_records(limit=1)
+            test_records = check_records_api(page_data)
             if test_records is None:
                 st.warning("⚠️ **Demo Mode Active** - API connection issues detected. Showing demo data.")
         except Exception:
@@ -124,12 +559,28 @@ def main():
 
                 if lat and lon:
                     submission_id = api_records.add_record_to_api(
-                        dialect_word, location_text, image_data, lat, lon, selected_category
+                        dialect_word, location_text, image_data, lat, lon, selected_category,
+                        filename=uploaded_image.name,
                     )
                     
                     if submission_id:
                         st.success("Thank you for your contribution!")
-                        st.cache_data.clear()
+                        user_info = api_auth_ui.api_auth.get_user_info() or {}
+                        region = get_state_resolver().resolve(lat, lon)
+                        add_record_to_cache({
+                            "id": submission_id,
+                            "dialect_word": dialect_word,
+                            "location_text": location_text,
+                            "latitude": lat,
+                            "longitude": lon,
+                            # The filter index files it under the state named in the text first
+                            "nearest_place": region["nearest_place"],
+                            "category_id": selected_category,
+                            "image_path": None,
+                            "is_verified": False,
+                            "user_id": user_info.get("user_id"),
+                            "created_at": datetime.now(timezone.utc).isoformat(),
+                        })
                         st.rerun()
                     else:
                         st.error("Failed to submit record. Please try again.")
@@ -141,15 +592,13 @@ def main():
         st.markdown("---")
         st.header("Project Stats")
         
-        if api_auth_ui.api_auth.is_authenticated():
-            records = api_records.get_records_for_map()
-            st.metric("Total Contributions", f"{len(records)}")
-            
-            if records:
-                unique_locations = len(set(record.get('location_text', '') for record in records))
-                st.metric("Unique Locations Mapped", f"{unique_locations}")
-            else:
-                st.metric("Unique Locations Mapped", "0")
+        if records_available:
+            stats = get_record_stats()
+            st.metric("Total Contributions", f"{stats['total']}")
+            st.metric("Unique Locations Mapped", f"{len(stats['locations'])}")
+        elif api_auth_ui.api_auth.is_authenticated():
+            st.metric("Total Contributions", "Unavailable")
+            st.metric("Unique Locations Mapped", "Unavailable")
         else:
             st.metric("Total Contributions", "Login to view")
             st.metric("Unique Locations Mapped", "Login to view")
@@ -157,13 +606,10 @@ def main():
         st.markdown("---")
         st.header("Export Data")
 
-        if api_auth_ui.api_auth.is_authenticated():
-            records = api_records.get_records_for_map()
-            if records:
-                # Convert records to DataFrame for CSV export
-                df = pd.DataFrame(records)
-                csv = df.to_csv(index=False).encode("utf-8")
-                
+        if records_available:
+            if get_record_stats()["total"]:
+                csv = get_records_csv()
+
                 st.download_button(
                     label="Download data as CSV",
                     data=csv,
@@ -173,6 +619,8 @@ def main():
                 )
             else:
                 st.info("No records available for download")
+        elif api_auth_ui.api_auth.is_authenticated():
+            st.info("Records are temporarily unavailable")
         else:
             st.info("Login to download data")
 
@@ -180,13 +628,12 @@ def main():
         st.header("Submission of the Day")
         
         if api_auth_ui.api_auth.is_authenticated():
-            random_record = api_records.get_random_record()
             if random_record:
                 sub_id = random_record.get('id')
                 sub_word = random_record.get('dialect_word')
                 sub_loc = random_record.get('location_text')
                 
-                image_data = api_records.get_image_from_api(sub_id)
+                image_data = get_random_record_image(page_data, sub_id)
                 if image_data:
                     try:
                         st.image(
@@ -206,45 +653,7 @@ def main():
     # --- Main Page ---
 
     # --- Filtering ---
-    states = [
-        "All States",
-        "Andaman and Nicobar Islands",
-        "Andhra Pradesh",
-        "Arunachal Pradesh",
-        "Assam",
-        "Bihar",
-        "Chandigarh",
-        "Chhattisgarh",
-        "Dadra and Nagar Haveli and Daman and Diu",
-        "Delhi",
-        "Goa",
-        "Gujarat",
-        "Haryana",
-        "Himachal Pradesh",
-        "Jammu and Kashmir",
-        "Jharkhand",
-        "Karnataka",
-        "Kerala",
-        "Ladakh",
-        "Lakshadweep",
-        "Madhya Pradesh",
-        "Maharashtra",
-        "Manipur",
-        "Meghalaya",
-        "Mizoram",
-        "Nagaland",
-        "Odisha",
-        "Puducherry",
-        "Punjab",
-        "Rajasthan",
-        "Sikkim",
-        "Tamil Nadu",
-        "Telangana",
-        "Tripura",
-        "Uttar Pradesh",
-        "Uttarakhand",
-        "West Bengal",
-    ]
+    states = ["All States"] + record_filters.STATES
 
     col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
@@ -269,58 +678,20 @@ def main():
 
     # Get records from API
     if api_auth_ui.api_auth.is_authenticated():
-        try:
-            records = api_records.get_records_for_map()
-            filtered_records = records
-        except Exception as e:
+        if records_available:
+            filter_index = get_filter_index()
+        else:
             st.warning("⚠️ API temporarily unavailable. Showing demo data.")
             # Fallback to demo data when API is down
-            records = [
-                {
-                    "id": "demo_1",
-                    "dialect_word": "Baingan",
-                    "location_text": "Hyderabad, Telangana",
-                    "latitude": 17.3850,
-                    "longitude": 78.4867,
-                    "image_path": None,
-                    "is_verified": True,
-                    "user_id": "demo_user",
-                    "created_at": "2025-01-01T00:00:00Z"
-                },
-                {
-                    "id": "demo_2", 
-                    "dialect_word": "Cycle",
-                    "location_text": "Mumbai, Maharashtra",
-                    "latitude": 19.0760,
-                    "longitude": 72.8777,
-                    "image_path": None,
-                    "is_verified": True,
-                    "user_id": "demo_user",
-                    "created_at": "2025-01-01T00:00:00Z"
-                }
-            ]
-            filtered_records = records
-        
-        # Apply search filter
-        if search_query:
-            filtered_records = [
-                record for record in filtered_records
-                if search_query.lower() in record.get('dialect_word', '').lower()
-            ]
-        
-        # Apply state filter
-        if state_filter != "All States":
-            filtered_records = [
-                record for record in filtered_records
-                if state_filter.lower() in record.get('location_text', '').lower()
-            ]
-        
-        # Apply category filter
-        if selected_category_filter:
-            # Note: Category filtering would need to be implemented based on API response structure
-            st.info(f"Category filtering: {selected_category_filter}")
+            filter_index = record_filters.RecordFilterIndex(DEMO_RECORDS, resolve_state)
+        filtered = filter_index.filtered(
+            search_query,
+            state_filter if state_filter != "All States" else None,
+            selected_category_filter,
+        )
     else:
-        filtered_records = []
+        filtered = record_filters.FilteredRecords([])
+    filtered_records = filtered.records
 
     tab1, tab2, tab3 = st.tabs(["🗺️ Interactive Map", "🖼️ Community Gallery", "🚀 API Mode"])
 
@@ -328,55 +699,43 @@ def main():
         st.subheader("A Living Map of India's Languages")
         
         if api_auth_ui.api_auth.is_authenticated():
-            # Filter records with valid coordinates
-            map_data = [
-                record for record in filtered_records
-                if record.get('latitude') and record.get('longitude')
-            ]
-
-            m = folium.Map(
-                location=[20.5937, 78.9629], zoom_start=5, tiles="CartoDB positron"
-            )
+            # Records with valid coordinates, indexed once per filter combination
+            map_data = filtered.map_records
 
             if map_data:
-                heat_data = [
-                    [record["latitude"], record["longitude"]] for record in map_data
-                ]
-                HeatMap(heat_data, radius=15).add_to(
-                    folium.FeatureGroup(name="Heatmap").add_to(m)
-                )
+                center, zoom, bounds = get_map_viewport()
+                m = folium.Map(location=MAP_CENTER, zoom_start=MAP_ZOOM, tiles="CartoDB positron")
 
-                marker_cluster = MarkerCluster(name="Submissions").add_to(m)
-                for record in map_data:
-                    image_data = api_records.get_image_from_api(record["id"])
-                    if image_data:
-                        try:
-                            image_format = get_image_format(image_data)
-                            encoded = base64.b64encode(image_data).decode()
-                            html = f'<img src="data:image/{image_format};base64,{encoded}" width="150"><br><b>{record["dialect_word"]}</b>'
-                        except Exception:
-                            html = f'<b>{record["dialect_word"]}</b><br><i>Image unavailable</i>'
-                    else:
-                        html = f'<b>{record["dialect_word"]}</b><br><i>Image unavailable</i>'
-
-                    popup = folium.Popup(html, max_width=200)
-
-                    icon = folium.DivIcon(
-                        html=f'<div style="font-size: 24px;">📍</div>',
-                        icon_size=(30, 30),
-                        icon_anchor=(15, 30),
-                    )
-                    
-                    location_text = record.get("location_text", "Unknown Location")
-                    folium.Marker(
-                        location=[record["latitude"], record["longitude"]],
-                        popup=popup,
-                        tooltip=f"{record['dialect_word']} ({location_text})",
-                        icon=icon,
-                    ).add_to(marker_cluster)
-
-                folium.LayerControl().add_to(m)
-                st_folium(m, width="100%", height=700, returned_objects=[])
+                # The heatmap ships pre-aggregated density cells, not every point
+                density_grids = get_density_grids(
+                    "api" if records_available else "demo",
+                    search_query, state_filter, selected_category_filter,
+                )
+                density_grids.add_records(map_data)
+                heatmap = folium.FeatureGroup(name="Heatmap")
+                HeatMap(
+                    density_grids.cells(zoom, bounds), radius=15, max_zoom=zoom
+                ).add_to(heatmap)
+
+                # Only records inside the current viewport become markers
+                visible_records = filtered.grid.query_bbox(*bounds)
+                submissions = folium.FeatureGroup(name="Submissions")
+                if zoom < CLUSTER_BELOW_ZOOM or len(visible_records) > MAX_VIEWPORT_MARKERS:
+                    add_cluster_markers(submissions, visible_records, zoom)
+                else:
+                    add_record_markers(submissions, visible_records)
+
+                st_folium(
+                    m,
+                    key="dialect_map",
+                    center=center,
+                    zoom=zoom,
+                    feature_group_to_add=[heatmap, submissions],
+                    layer_control=folium.LayerControl(),
+                    width="100%",
+                    height=700,
+                    returned_objects=["bounds", "zoom", "center"],
+                )
             else:
                 st.info(
                     "No submissions match your criteria. Try a different filter or be the first to contribute!"
@@ -409,15 +768,19 @@ def main():
 
                 paginated_records = filtered_records[start_index:end_index]
 
+                thumbnail_cache = get_thumbnail_cache()
+                thumbnail_files = get_thumbnail_files(
+                    [record["id"] for record in paginated_records], "gallery"
+                )
+
                 cols = st.columns(4)
                 for i, record in enumerate(paginated_records):
                     with cols[i % 4]:
-                        image_data = api_records.get_image_from_api(record["id"])
-                        if image_data:
+                        thumbnail_file = thumbnail_files.get(record["id"])
+                        if thumbnail_file:
                             try:
-                                image = Image.open(io.BytesIO(image_data))
                                 st.image(
-                                    image,
+                                    thumbnail_cache.path(thumbnail_file),
                                     caption=f"'{record['dialect_word']}' from {record.get('location_text', 'Unknown Location')}",
                                     use_container_width=True,
                                 )
@@ -440,7 +803,7 @@ def main():
         if api_auth_ui.api_auth.is_authenticated():
             try:
                 # Test API connection
-                test_records = api_records.api_records.get_records(limit=1)
+                test_records = check_records_api(page_data)
                 if test_records is not None:
                     st.success("✅ API connection successful")
                 else:
@@ -463,37 +826,47 @@ def main():
             st.subheader("📊 API Statistics")
             
             # Get user's records
-            user_id = None
-            if api_auth_ui.api_auth.user_info:
-                user_id = api_auth_ui.api_auth.user_info.get("user_id")
+            user_id = get_current_user_id(api_auth_ui.api_auth)
             
-            user_records = []
+            # Stream the user's records page by page, keeping only counts and the first few
+            contribution_count = 0
+            verified_count = 0
+            recent_records = []
             if user_id:
-                user_records = api_records.api_records.get_records(
-                    user_id=user_id,
-                    limit=1000
-                )
+                user_records = page_data.get("user_records")
+                if not isinstance(user_records, list) or len(user_records) >= api_records.api_records.page_size:
+                    # Not prefetched, failed, or more than one page: list them all here
+                    user_records = api_records.api_records.iter_records(user_id=user_id)
+                try:
+                    for record in user_records:
+                        contribution_count += 1
+                        if record.get("reviewed", False):
+                            verified_count += 1
+                        if len(recent_records) < 5:
+                            recent_records.append(record)
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    # Counts from a partial listing would be wrong, so none are shown
+                    st.error(f"Could not load your contributions: {str(e)}")
+                    contribution_count = verified_count = 0
+                    recent_records = []
             
             # Get category statistics
             category_stats = api_categories.get_category_statistics()
             
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Your Contributions", len(user_records))
+                st.metric("Your Contributions", contribution_count)
             with col2:
-                verified_count = len([r for r in user_records if r.get("reviewed", False)])
                 st.metric("Verified Records", verified_count)
             with col3:
-                pending_count = len([r for r in user_records if not r.get("reviewed", False)])
-                st.metric("Pending Review", pending_count)
+                st.metric("Pending Review", contribution_count - verified_count)
             with col4:
                 st.metric("Categories", category_stats.get("published_categories", 0))
             
             # Show recent contributions
-            if user_records:
+            if recent_records:
                 st.markdown("---")
                 st.subheader("Your Recent Contributions")
-                recent_records = user_records[:5]  # Show last 5
                 
                 for record in recent_records:
                     with st.expander(f"'{record.get('title', 'Untitled')}' - {record.get('created_at', 'Unknown date')[:10]}"):
@@ -0,0 +1,270 @@
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Default cell size of the record index in degrees (~55 km at the equator)
+DEFAULT_CELL_SIZE = 0.5
+
+# Width in pixels of one server-side cluster cell on screen
+CLUSTER_CELL_PIXELS = 64
+
+# Width in pixels of one heatmap density cell and the zoom levels we keep grids for
+HEAT_CELL_PIXELS = 16
+HEAT_MIN_ZOOM = 3
+HEAT_MAX_ZOOM = 14
+
+
+def _coordinates(record: Dict[str, Any]):
+    """Get a record's (lat, lon), or None if it has no usable coordinates"""
+    lat = record.get("latitude")
+    lon = record.get("longitude")
+    if lat is None or lon is None:
+        return None
+    try:
+        return float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def haversine_km_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Vectorized great-circle distances from one point to many, in kilometres"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(lons - lon)
+    a = np.sin(d_phi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bbox_around(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) box that contains every point within radius_km"""
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    d_lon = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon
+
+
+def within_radius(candidates: Iterable[Tuple[Any, float, float]], lat: float, lon: float,
+                  radius_km: float, limit: int) -> List[Tuple[Any, float]]:
+    """Refine bounding-box candidates to the nearest ones inside the radius
+
+    candidates are (id, latitude, longitude) rows, typically those of the
+    bbox_around prefilter. Distances are computed exactly with a vectorized
+    haversine; returns up to limit (id, distance_km) pairs, nearest first.
+    """
+    rows = [row for row in candidates if row[1] is not None and row[2] is not None]
+    if not rows:
+        return []
+    lats = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows))
+    lons = np.fromiter((row[2] for row in rows), dtype=float, count=len(rows))
+    distances = haversine_km_many(lat, lon, lats, lons)
+
+    inside = np.flatnonzero(distances <= radius_km)
+    if len(inside) > limit:
+        # Only the nearest limit candidates need a full sort
+        inside = inside[np.argpartition(distances[inside], limit - 1)[:limit]]
+    inside = inside[np.argsort(distances[inside], kind="stable")]
+    return [(rows[i][0], float(distances[i])) for i in inside]
+
+
+class GridIndex:
+    """Spatial index bucketing records into a uniform lat/lon grid"""
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        self._count = 0
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]],
+                     cell_size: float = DEFAULT_CELL_SIZE) -> "GridIndex":
+        index = cls(cell_size)
+        for record in records:
+            index.add(record)
+        return index
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lon / self.cell_size)
+
+    def add(self, record: Dict[str, Any]) -> bool:
+        """Add a record to the index; records without coordinates are skipped"""
+        coordinates = _coordinates(record)
+        if coordinates is None:
+            return False
+        self._cells.setdefault(self._cell(*coordinates), []).append(record)
+        self._count += 1
+        return True
+
+    def query_bbox(self, south: float, west: float, north: float,
+                   east: float) -> List[Dict[str, Any]]:
+        """Get all records inside a bounding box"""
+        min_row, min_col = self._cell(south, west)
+        max_row, max_col = self._cell(north, east)
+        span = (max_row - min_row + 1) * (max_col - min_col + 1)
+
+        # Walk whichever is smaller: the cells in the box or the occupied cells
+        if span <= len(self._cells):
+            cells = (
+                self._cells.get((row, col), ())
+                for row in range(min_row, max_row + 1)
+                for col in range(min_col, max_col + 1)
+            )
+        else:
+            cells = (
+                bucket for (row, col), bucket in self._cells.items()
+                if min_row <= row <= max_row and min_col <= col <= max_col
+            )
+
+        results = []
+        for bucket in cells:
+            for record in bucket:
+                lat, lon = _coordinates(record)
+                if south <= lat <= north and west <= lon <= east:
+                    results.append(record)
+        return results
+
+    def nearest(self, lat: float, lon: float, max_km: float) -> Optional[Dict[str, Any]]:
+        """Get the record closest to a point, if any lies within max_km"""
+        best, best_km = None, max_km
+        for record in self.query_bbox(*bbox_around(lat, lon, max_km)):
+            distance = haversine_km(lat, lon, *_coordinates(record))
+            if distance <= best_km:
+                best, best_km = record, distance
+        return best
+
+
+def cluster_cell_size(zoom: int) -> float:
+    """Size in degrees of a cluster cell spanning CLUSTER_CELL_PIXELS at zoom"""
+    # A 256px web mercator tile spans 360 / 2**zoom degrees of longitude
+    return (360.0 / 2 ** zoom) * (CLUSTER_CELL_PIXELS / 256.0)
+
+
+def cluster_records(records: Iterable[Dict[str, Any]], zoom: int) -> List[Dict[str, Any]]:
+    """Group records into grid clusters sized for the given zoom level
+
+    Each cluster has the mean latitude/longitude of its records, a count and
+    the records themselves.
+    """
+    size = cluster_cell_size(zoom)
+    clusters: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    for record in records:
+        coordinates = _coordinates(record)
+        if coordinates is None:
+            continue
+        lat, lon = coordinates
+        key = (math.floor(lat / size), math.floor(lon / size))
+        cluster = clusters.get(key)
+        if cluster is None:
+            cluster = clusters[key] = {"lat_sum": 0.0, "lon_sum": 0.0, "records": []}
+        cluster["lat_sum"] += lat
+        cluster["lon_sum"] += lon
+        cluster["records"].append(record)
+
+    return [
+        {
+            "latitude": cluster["lat_sum"] / len(cluster["records"]),
+            "longitude": cluster["lon_sum"] / len(cluster["records"]),
+            "count": len(cluster["records"]),
+            "records": cluster["records"],
+        }
+        for cluster in clusters.values()
+    ]
+
+
+class DensityGrids:
+    """Pre-aggregated per-zoom record density grids for the heatmap
+
+    Points are binned with NumPy into one grid per zoom level, so the map
+    only ships the occupied cells of the current zoom instead of every
+    record. Records are added incrementally and each record id is counted
+    once, so feeding the full record list again only bins the new ones.
+    """
+
+    def __init__(self, min_zoom: int = HEAT_MIN_ZOOM, max_zoom: int = HEAT_MAX_ZOOM):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self._grids: Dict[int, Dict[Tuple[int, int], int]] = {
+            zoom: {} for zoom in range(min_zoom, max_zoom + 1)
+        }
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cell_size(zoom: int) -> float:
+        return (360.0 / 2 ** zoom) * (HEAT_CELL_PIXELS / 256.0)
+
+    def add_records(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Bin records not seen before into every zoom grid; returns how many were added"""
+        lats, lons = [], []
+        with self._lock:
+            for record in records:
+                record_id = record.get("id")
+                if record_id in self._seen:
+                    continue
+                coordinates = _coordinates(record)
+                if coordinates is None:
+                    continue
+                self._seen.add(record_id)
+                lats.append(coordinates[0])
+                lons.append(coordinates[1])
+
+            if lats:
+                self._add_points(np.asarray(lats), np.asarray(lons))
+        return len(lats)
+
+    def _add_points(self, lats: np.ndarray, lons: np.ndarray):
+        for zoom, grid in self._grids.items():
+            size = self.cell_size(zoom)
+            cells = np.stack(
+                [np.floor(lats / size), np.floor(lons / size)], axis=1
+            ).astype(np.int64)
+            unique_cells, counts = np.unique(cells, axis=0, return_counts=True)
+            for (row, col), count in zip(unique_cells.tolist(), counts.tolist()):
+                grid[(row, col)] = grid.get((row, col), 0) + count
+
+    def cells(self, zoom: int, bounds: Optional[Tuple[float, float, float, float]] = None
+              ) -> List[List[float]]:
+        """Get [lat, lon, weight] cell centers for a zoom level, optionally within bounds
+
+        Weights are normalized to 0-1 against the densest returned cell.
+        """
+        zoom = min(max(int(zoom), self.min_zoom), self.max_zoom)
+        size = self.cell_size(zoom)
+        with self._lock:
+            grid = self._grids[zoom]
+            if not grid:
+                return []
+            keys = np.array(list(grid.keys()), dtype=np.int64)
+            counts = np.fromiter(grid.values(), dtype=np.float64, count=len(grid))
+
+        lats = (keys[:, 0] + 0.5) * size
+        lons = (keys[:, 1] + 0.5) * size
+        if bounds is not None:
+            south, west, north, east = bounds
+            # Keep a one cell margin so the heat does not clip at the viewport edge
+            mask = (
+                (lats >= south - size) & (lats <= north + size)
+                & (lons >= west - size) & (lons <= east + size)
+            )
+            lats, lons, counts = lats[mask], lons[mask], counts[mask]
+        if not len(counts):
+            return []
+
+        weights = counts / counts.max()
+        return np.column_stack([lats, lons, weights]).tolist()
@@ -0,0 +1,291 @@
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from geopy.extra.rate_limiter import RateLimiter
+from geopy.geocoders import Nominatim
+
+import geo_index
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GAZETTEER_PATH = os.path.join(BASE_DIR, "data", "india_gazetteer.csv")
+GEOCODE_CACHE_PATH = os.path.join(BASE_DIR, "geocode_cache.db")
+# Optional state boundary polygons (GeoJSON FeatureCollection, one feature per state)
+STATE_BOUNDARIES_PATH = os.path.join(BASE_DIR, "data", "india_states.geojson")
+
+# Range within which the nearest gazetteer place is reported for a point
+NEAREST_PLACE_MAX_KM = 150.0
+# Without boundaries, a point takes the state of the nearest place within this range,
+# unless a place of another state is less than STATE_BORDER_MARGIN_KM farther away
+NEAREST_STATE_MAX_KM = 60.0
+STATE_BORDER_MARGIN_KM = 25.0
+
+# Nominatim's usage policy allows at most one request per second
+NOMINATIM_MIN_DELAY = 1.0
+# Failed lookups are remembered for a day so typos do not hit Nominatim on every submit
+NEGATIVE_CACHE_TTL = 24 * 60 * 60
+
+_COUNTRY_SUFFIXES = ("india", "bharat")
+
+
+def normalize_place_name(name: str) -> str:
+    """Normalize a free-text place name into a cache and gazetteer key"""
+    name = unicodedata.normalize("NFKC", name or "").casefold()
+    name = re.sub(r"[^\w\s,]", " ", name)
+    parts = [re.sub(r"\s+", " ", part).strip() for part in name.split(",")]
+    parts = [part for part in parts if part]
+    while parts and parts[-1] in _COUNTRY_SUFFIXES:
+        parts.pop()
+    return ", ".join(parts)
+
+
+class Gazetteer:
+    """Offline lookup table of Indian cities and towns"""
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        self.places: Dict[str, Dict[str, object]] = {}
+        self._states = set()
+        if os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path: str):
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                place = {
+                    "name": row["name"],
+                    "state": row["state"],
+                    "latitude": float(row["latitude"]),
+                    "longitude": float(row["longitude"]),
+                }
+                self._states.add(normalize_place_name(row["state"]))
+                names = [row["name"]] + [a for a in (row.get("aliases") or "").split("|") if a]
+                for name in names:
+                    self.places.setdefault(normalize_place_name(name), place)
+
+    def lookup(self, location_name: str) -> Optional[Dict[str, object]]:
+        """Find a place by name, also accepting "Town, State" style input"""
+        key = normalize_place_name(location_name)
+        if not key:
+            return None
+        place = self.places.get(key)
+        if place:
+            return place
+
+        # Only the most specific part may match, so "Kondapur, Hyderabad" still
+        # goes to the remote geocoder instead of resolving to Hyderabad itself
+        parts = key.split(", ")
+        state = parts[-1] if len(parts) > 1 and parts[-1] in self._states else None
+        place = self.places.get(parts[0])
+        if place and (state is None or normalize_place_name(place["state"]) == state):
+            return place
+        return None
+
+
+def _point_in_ring(lat: float, lon: float, ring: List[List[float]]) -> bool:
+    """Ray casting test of a point against a closed GeoJSON [lon, lat] ring"""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+class StateBoundaries:
+    """Point-in-polygon lookup against state boundary polygons
+
+    Each polygon keeps its bounding box, so a lookup only runs the ray
+    casting test on the few states whose box contains the point.
+    """
+
+    NAME_PROPERTIES = ("state", "st_nm", "NAME_1", "name")
+
+    def __init__(self, path: str = STATE_BOUNDARIES_PATH):
+        self.polygons: List[Dict[str, Any]] = []
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._load(json.load(f))
+
+    def __bool__(self) -> bool:
+        return bool(self.polygons)
+
+    def _load(self, collection: Dict[str, Any]):
+        for feature in collection.get("features", []):
+            properties = feature.get("properties") or {}
+            name = next((properties[k] for k in self.NAME_PROPERTIES if properties.get(k)), None)
+            geometry = feature.get("geometry") or {}
+            if not name or geometry.get("type") not in ("Polygon", "MultiPolygon"):
+                continue
+            polygons = geometry["coordinates"]
+            if geometry["type"] == "Polygon":
+                polygons = [polygons]
+            for rings in polygons:
+                lons = [point[0] for point in rings[0]]
+                lats = [point[1] for point in rings[0]]
+                self.polygons.append({
+                    "state": name,
+                    "bbox": (min(lats), min(lons), max(lats), max(lons)),
+                    "rings": rings,
+                })
+
+    def lookup(self, lat: float, lon: float) -> Optional[str]:
+        for polygon in self.polygons:
+            south, west, north, east = polygon["bbox"]
+            if not (south <= lat <= north and west <= lon <= east):
+                continue
+            exterior, holes = polygon["rings"][0], polygon["rings"][1:]
+            if _point_in_ring(lat, lon, exterior) and not any(
+                _point_in_ring(lat, lon, hole) for hole in holes
+            ):
+                return polygon["state"]
+        return None
+
+
+class StateResolver:
+    """Resolve coordinates to a state and the nearest known place
+
+    Uses state boundary polygons when they are installed and otherwise the
+    state of the nearest gazetteer place, found through a grid index.
+    """
+
+    def __init__(self, gazetteer: Optional[Gazetteer] = None,
+                 boundaries_path: str = STATE_BOUNDARIES_PATH):
+        gazetteer = gazetteer or Gazetteer()
+        places = {id(place): place for place in gazetteer.places.values()}.values()
+        self.places = geo_index.GridIndex.from_records(places)
+        self.boundaries = StateBoundaries(boundaries_path)
+
+    def resolve(self, lat: float, lon: float) -> Dict[str, Optional[str]]:
+        """Get {"state": ..., "nearest_place": ...} for a point; values may be None"""
+        place = self.places.nearest(lat, lon, NEAREST_PLACE_MAX_KM)
+        if self.boundaries:
+            state = self.boundaries.lookup(lat, lon)
+        else:
+            state = self._nearest_place_state(lat, lon)
+        return {"state": state, "nearest_place": place["name"] if place else None}
+
+    def _nearest_place_state(self, lat: float, lon: float) -> Optional[str]:
+        """Get the state of the nearest place, or None if the point may lie across a border
+
+        Nearest-place lookups are unreliable near state borders, so the
+        state is only trusted when no place of another state is almost as
+        close. Unresolved points are better left out of a state filter than
+        filed under the neighbouring state.
+        """
+        search_km = NEAREST_STATE_MAX_KM + STATE_BORDER_MARGIN_KM
+        nearby = sorted(
+            (geo_index.haversine_km(lat, lon, place["latitude"], place["longitude"]), place["state"])
+            for place in self.places.query_bbox(*geo_index.bbox_around(lat, lon, search_km))
+        )
+        if not nearby or nearby[0][0] > NEAREST_STATE_MAX_KM:
+            return None
+        nearest_km, state = nearby[0]
+        for distance, other_state in nearby[1:]:
+            if distance > nearest_km + STATE_BORDER_MARGIN_KM:
+                break
+            if other_state != state:
+                return None
+        return state
+
+
+class GeocodeCache:
+    """Persistent SQLite cache of geocoding results shared by all sessions"""
+
+    def __init__(self, path: str = GEOCODE_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocode_cache ("
+                " query TEXT PRIMARY KEY,"
+                " latitude REAL,"
+                " longitude REAL,"
+                " source TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    def get(self, query: str):
+        """Get (latitude, longitude) for a normalized query, or None on a miss
+
+        Cached failures come back as (None, None) until they expire.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT latitude, longitude, created_at FROM geocode_cache WHERE query = ?",
+                (query,),
+            ).fetchone()
+        if row is None:
+            return None
+        latitude, longitude, created_at = row
+        if latitude is None and time.time() - created_at > NEGATIVE_CACHE_TTL:
+            return None
+        return latitude, longitude
+
+    def set(self, query: str, latitude: Optional[float], longitude: Optional[float],
+            source: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?)",
+                (query, latitude, longitude, source, time.time()),
+            )
+
+
+class Geocoder:
+    """Geocode place names via the gazetteer, the SQLite cache, then Nominatim"""
+
+    def __init__(self, cache_path: str = GEOCODE_CACHE_PATH,
+                 gazetteer_path: str = GAZETTEER_PATH):
+        self.gazetteer = Gazetteer(gazetteer_path)
+        self.cache = GeocodeCache(cache_path)
+        self._geolocator = None
+        self._remote_geocode = None
+        self._lock = threading.Lock()
+
+    def _remote(self):
+        with self._lock:
+            if self._remote_geocode is None:
+                self._geolocator = Nominatim(user_agent="dialect_map_app")
+                self._remote_geocode = RateLimiter(
+                    self._geolocator.geocode,
+                    min_delay_seconds=NOMINATIM_MIN_DELAY,
+                    max_retries=1,
+                    swallow_exceptions=False,
+                )
+            return self._remote_geocode
+
+    def geocode(self, location_name: str) -> Tuple[Optional[float], Optional[float]]:
+        """Geocode a location name to (latitude, longitude), or (None, None)"""
+        query = normalize_place_name(location_name)
+        if not query:
+            return None, None
+
+        place = self.gazetteer.lookup(query)
+        if place:
+            return place["latitude"], place["longitude"]
+
+        cached = self.cache.get(query)
+        if cached is not None:
+            return cached
+
+        try:
+            location = self._remote()(location_name, country_codes="IN")
+        except Exception as e:
+            # Not cached, so the next submission retries the lookup
+            print(f"Geocoding error: {e}")
+            return None, None
+
+        if location:
+            self.cache.set(query, location.latitude, location.longitude, "nominatim")
+            return location.latitude, location.longitude
+        self.cache.set(query, None, None, "nominatim")
+        return None, None
@@ -0,0 +1,134 @@
+import json
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Record fields a client may set on create or update
+RECORD_FIELDS = (
+    "title", "description", "media_type", "latitude", "longitude",
+    "category_id", "user_id", "release_rights", "language",
+)
+REQUIRED_CREATE_FIELDS = ("title", "latitude", "longitude", "category_id", "user_id")
+
+BULK_OPERATIONS = ("create", "update", "delete")
+# Rows written per transaction
+BULK_CHUNK_SIZE = 500
+# Rows accepted in one request
+BULK_MAX_ROWS = 20000
+# Longest NDJSON line accepted, so one bad line cannot exhaust memory
+BULK_MAX_LINE_BYTES = 1024 * 1024
+
+
+class BatchError(Exception):
+    """A batch that cannot be processed at all; carries the HTTP status"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def iter_ndjson(stream: BinaryIO) -> Iterator[Any]:
+    """Parse newline-delimited JSON from a stream, one line at a time
+
+    Lines that are not valid JSON yield a ValueError in their place so
+    they can be reported against their row number.
+    """
+    while True:
+        line = stream.readline(BULK_MAX_LINE_BYTES + 1)
+        if not line:
+            return
+        if len(line) > BULK_MAX_LINE_BYTES:
+            raise BatchError("NDJSON line is too long", 413)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+
+
+def parse_rows(stream: BinaryIO, mimetype: str) -> List[Any]:
+    """Read batch rows from an NDJSON body or a JSON array body"""
+    if mimetype in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        rows = []
+        for row in iter_ndjson(stream):
+            rows.append(row)
+            if len(rows) > BULK_MAX_ROWS:
+                raise BatchError(f"At most {BULK_MAX_ROWS} rows per request", 413)
+        return rows
+
+    try:
+        rows = json.load(stream)
+    except ValueError as e:
+        raise BatchError(f"Invalid JSON: {e}") from None
+    if isinstance(rows, dict):
+        rows = rows.get("records")
+    if not isinstance(rows, list):
+        raise BatchError('Expected a JSON array or {"records": [...]}')
+    if len(rows) > BULK_MAX_ROWS:
+        raise BatchError(f"At most {BULK_MAX_ROWS} rows per request", 413)
+    return rows
+
+
+def _number(fields: Dict[str, Any], name: str, low: float, high: float) -> Optional[str]:
+    if name not in fields:
+        return None
+    try:
+        value = float(fields[name])
+    except (TypeError, ValueError):
+        return f"{name} must be a number"
+    if not low <= value <= high:
+        return f"{name} must be between {low} and {high}"
+    fields[name] = value
+    return None
+
+
+def validate_row(row: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Check one batch row; returns ({"op", "id", "fields"}, None) or (None, error)"""
+    if isinstance(row, Exception):
+        return None, str(row)
+    if not isinstance(row, dict):
+        return None, "Row must be a JSON object"
+
+    op = row.get("op", "update" if row.get("id") is not None else "create")
+    if op not in BULK_OPERATIONS:
+        return None, f"op must be one of {', '.join(BULK_OPERATIONS)}"
+    record_id = row.get("id")
+    if op != "create" and record_id is None:
+        return None, f"id is required to {op} a record"
+
+    fields = {key: value for key, value in row.items() if key not in ("op", "id")}
+    unknown = sorted(set(fields) - set(RECORD_FIELDS))
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}"
+    if op == "delete":
+        return {"op": op, "id": record_id, "fields": {}}, None
+
+    if op == "create":
+        missing = [name for name in REQUIRED_CREATE_FIELDS if fields.get(name) in (None, "")]
+        if missing:
+            return None, f"Missing fields: {', '.join(missing)}"
+    elif not fields:
+        return None, "Nothing to update"
+
+    error = _number(fields, "latitude", -90.0, 90.0) or _number(fields, "longitude", -180.0, 180.0)
+    if error:
+        return None, error
+    return {"op": op, "id": record_id, "fields": fields}, None
+
+
+def validate_rows(rows: Iterable[Any]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Validate every row; returns (valid rows with their index, per-row errors)"""
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        checked, error = validate_row(row)
+        if error:
+            errors.append({"index": index, "status": "error", "error": error})
+        else:
+            checked["index"] = index
+            valid.append(checked)
+    return valid, errors
+
+
+def chunked(rows: List[Any], size: int = BULK_CHUNK_SIZE) -> Iterator[List[Any]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
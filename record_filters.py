@@ -0,0 +1,213 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+import geo_index
+
+# Filter combinations whose results are kept, least recently used evicted first
+MAX_CACHED_QUERIES = 32
+
+STATES = [
+    "Andaman and Nicobar Islands",
+    "Andhra Pradesh",
+    "Arunachal Pradesh",
+    "Assam",
+    "Bihar",
+    "Chandigarh",
+    "Chhattisgarh",
+    "Dadra and Nagar Haveli and Daman and Diu",
+    "Delhi",
+    "Goa",
+    "Gujarat",
+    "Haryana",
+    "Himachal Pradesh",
+    "Jammu and Kashmir",
+    "Jharkhand",
+    "Karnataka",
+    "Kerala",
+    "Ladakh",
+    "Lakshadweep",
+    "Madhya Pradesh",
+    "Maharashtra",
+    "Manipur",
+    "Meghalaya",
+    "Mizoram",
+    "Nagaland",
+    "Odisha",
+    "Puducherry",
+    "Punjab",
+    "Rajasthan",
+    "Sikkim",
+    "Tamil Nadu",
+    "Telangana",
+    "Tripura",
+    "Uttar Pradesh",
+    "Uttarakhand",
+    "West Bengal",
+]
+
+# Longest names first so "Dadra and Nagar Haveli and Daman and Diu" wins over shorter overlaps
+_STATE_PATTERN = re.compile(
+    "|".join(re.escape(state.lower()) for state in sorted(STATES, key=len, reverse=True))
+)
+_STATE_BY_KEY = {state.lower(): state for state in STATES}
+
+
+def normalize_text(text: Any) -> str:
+    """Lowercase and Unicode-normalize text for matching"""
+    return unicodedata.normalize("NFKC", str(text or "")).casefold().strip()
+
+
+def states_in_text(text: str) -> Set[str]:
+    """Get the state names mentioned in a free-text location"""
+    return {_STATE_BY_KEY[match] for match in _STATE_PATTERN.findall(normalize_text(text))}
+
+
+class FilteredRecords:
+    """The records matching one filter combination, with a spatial index over the mapped ones"""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        self.map_records = [record for record in records if _has_coordinates(record)]
+        self.grid = geo_index.GridIndex.from_records(self.map_records)
+
+    def add(self, record: Dict[str, Any]):
+        self.records.append(record)
+        if _has_coordinates(record):
+            self.map_records.append(record)
+            self.grid.add(record)
+
+
+def _has_coordinates(record: Dict[str, Any]) -> bool:
+    return bool(record.get("latitude") and record.get("longitude"))
+
+
+class RecordFilterIndex:
+    """Precomputed search, state and category indexes over a list of records
+
+    Normalized dialect words are kept in a pandas Series for vectorized
+    substring search, and state and category filters are inverted indexes
+    from value to record positions, all built once when a record is added.
+    State filtering is an exact lookup on the state resolved when the
+    record is indexed.
+    A query intersects the index sets and the search mask instead of
+    rescanning every record. The results of recent filter combinations,
+    with a spatial index over them, are kept and extended as records are
+    added, so a rerun with the same filters does not rebuild them.
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]] = (),
+                 resolve_state: Optional[Callable[[float, float], Optional[str]]] = None,
+                 max_cached_queries: int = MAX_CACHED_QUERIES):
+        self.resolve_state = resolve_state
+        self.max_cached_queries = max_cached_queries
+        self._filtered: "OrderedDict[Tuple[str, Optional[str], Any], FilteredRecords]" = OrderedDict()
+        self.records: List[Dict[str, Any]] = []
+        self._words: List[str] = []
+        self._word_series: Optional[pd.Series] = None
+        self._by_state: Dict[str, Set[int]] = {}
+        self._by_category: Dict[Any, Set[int]] = {}
+        self._lock = threading.Lock()
+        for record in records:
+            self.add(record)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def record_states(self, record: Dict[str, Any]) -> Set[str]:
+        """Get the states a record is filed under
+
+        The structured "state" field wins, then states named in the
+        location text ("Bidar, Karnataka"), which are what the contributor
+        meant. Only records naming no state are resolved from their
+        coordinates. Records are shared with other caches and sessions, so
+        the resolved state is kept in the index and never written back.
+        """
+        state = record.get("state")
+        if state:
+            return {state}
+        states = states_in_text(record.get("location_text", ""))
+        if states or self.resolve_state is None:
+            return states
+        try:
+            lat, lon = float(record["latitude"]), float(record["longitude"])
+        except (KeyError, TypeError, ValueError):
+            return set()
+        state = self.resolve_state(lat, lon)
+        return {state} if state else set()
+
+    def add(self, record: Dict[str, Any]) -> "RecordFilterIndex":
+        """Index one more record"""
+        with self._lock:
+            position = len(self.records)
+            word = normalize_text(record.get("dialect_word", ""))
+            states = self.record_states(record)
+            self.records.append(record)
+            self._words.append(word)
+            self._word_series = None
+            for state in states:
+                self._by_state.setdefault(state, set()).add(position)
+            category_id = record.get("category_id")
+            if category_id is not None:
+                self._by_category.setdefault(category_id, set()).add(position)
+
+            for (search, state, category), filtered in self._filtered.items():
+                if (search in word and (not state or state in states)
+                        and (category is None or category == category_id)):
+                    filtered.add(record)
+        return self
+
+    def filtered(self, search_query: str = "", state: Optional[str] = None,
+                 category_id: Any = None) -> FilteredRecords:
+        """Get the records matching the filters and a spatial index over them, cached per filters"""
+        key = (normalize_text(search_query), state or None, category_id)
+        with self._lock:
+            filtered = self._filtered.get(key)
+            if filtered is not None:
+                self._filtered.move_to_end(key)
+                return filtered
+            count = len(self.records)
+
+        filtered = FilteredRecords(self.query(search_query, state, category_id))
+        with self._lock:
+            # Records added while the query ran may be missing from it, so it is only kept if none were
+            if len(self.records) == count and key not in self._filtered:
+                self._filtered[key] = filtered
+                while len(self._filtered) > self.max_cached_queries:
+                    self._filtered.popitem(last=False)
+        return filtered
+
+    def _search_positions(self, search_query: str) -> np.ndarray:
+        if self._word_series is None:
+            self._word_series = pd.Series(self._words, dtype=object)
+        mask = self._word_series.str.contains(normalize_text(search_query), regex=False)
+        return np.flatnonzero(mask.to_numpy(dtype=bool))
+
+    def query(self, search_query: str = "", state: Optional[str] = None,
+              category_id: Any = None) -> List[Dict[str, Any]]:
+        """Get the records matching all given filters, in their original order"""
+        with self._lock:
+            candidates: Optional[Set[int]] = None
+            if state:
+                candidates = set(self._by_state.get(state, ()))
+            if category_id is not None:
+                by_category = self._by_category.get(category_id, set())
+                candidates = by_category if candidates is None else candidates & by_category
+
+            if search_query and search_query.strip():
+                matches = self._search_positions(search_query)
+                if candidates is None:
+                    positions = matches.tolist()
+                else:
+                    positions = [p for p in matches.tolist() if p in candidates]
+            elif candidates is None:
+                return list(self.records)
+            else:
+                positions = sorted(candidates)
+
+            return [self.records[position] for position in positions]
@@ -0,0 +1,106 @@
+import base64
+import json
+import math
+from typing import Any, Iterable, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Radius used by the nearby search when the client gives none, and the largest allowed
+DEFAULT_NEARBY_RADIUS_KM = 25.0
+MAX_NEARBY_RADIUS_KM = 500.0
+
+# Width of the latitude bands the nearby search seeks by, as bands per degree (~11 km)
+LATITUDE_BANDS_PER_DEGREE = 10
+
+
+class QueryError(Exception):
+    """An invalid list or search query; carries the HTTP status"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(last_key: Any) -> str:
+    """Make an opaque keyset cursor from the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps([last_key]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Any:
+    """Get the sort key a cursor continues after, or None for the first page"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded))[0]
+    except (ValueError, TypeError, IndexError):
+        raise QueryError("Invalid cursor") from None
+
+
+def parse_limit(value: Optional[str], default: int = DEFAULT_PAGE_SIZE,
+                maximum: int = MAX_PAGE_SIZE) -> int:
+    if value in (None, ""):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise QueryError("limit must be an integer") from None
+    if limit < 1:
+        raise QueryError("limit must be positive")
+    return min(limit, maximum)
+
+
+def parse_float(value: Optional[str], name: str, low: float, high: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"{name} must be a number") from None
+    if not low <= number <= high:
+        raise QueryError(f"{name} must be between {low} and {high}")
+    return number
+
+
+def parse_bbox(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Parse "south,west,north,east" into floats, or None if not given"""
+    if not value:
+        return None
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise QueryError("bbox must be south,west,north,east")
+    south = parse_float(parts[0], "bbox south", -90.0, 90.0)
+    west = parse_float(parts[1], "bbox west", -180.0, 180.0)
+    north = parse_float(parts[2], "bbox north", -90.0, 90.0)
+    east = parse_float(parts[3], "bbox east", -180.0, 180.0)
+    if south > north or west > east:
+        raise QueryError("bbox must be ordered south,west,north,east")
+    return south, west, north, east
+
+
+def parse_fields(value: Optional[str], allowed: Iterable[str],
+                 always: Iterable[str] = ("id",)) -> Optional[List[str]]:
+    """Parse a comma separated sparse field list, or None for all fields"""
+    if not value:
+        return None
+    allowed = set(allowed)
+    fields = list(dict.fromkeys(always))
+    for name in (part.strip() for part in value.split(",")):
+        if not name:
+            continue
+        if name not in allowed:
+            raise QueryError(f"Unknown field: {name}")
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def latitude_bands(south: float, north: float) -> List[int]:
+    """Latitude band numbers covering south..north, for an IN on the band index
+
+    Bands are whole multiples of 1 / LATITUDE_BANDS_PER_DEGREE degrees. One
+    extra band on either side absorbs how a database rounds the band
+    expression; within_radius drops the candidates outside the circle.
+    """
+    low = math.floor(south * LATITUDE_BANDS_PER_DEGREE) - 1
+    high = math.ceil(north * LATITUDE_BANDS_PER_DEGREE) + 1
+    return list(range(low, high + 1))
@@ -0,0 +1,231 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# Seconds between full reloads that catch deletes the API reports without tombstones
+RECONCILE_INTERVAL = 30 * 60
+# Seconds a failed sync waits before it is retried
+SYNC_RETRY_INTERVAL = 15
+
+
+def record_version(record: Dict[str, Any]) -> Optional[str]:
+    """Get the timestamp a record was last changed at, used as the sync cursor"""
+    return record.get("updated_at") or record.get("created_at")
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp into an aware datetime, or None
+
+    "Z" and "+00:00" suffixes compare equal, and timestamps without an
+    offset are taken as UTC.
+    """
+    if not isinstance(value, str) or not value:
+        return None
+    text = value.strip()
+    if text.endswith(("Z", "z")):
+        text = text[:-1] + "+00:00"
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def is_tombstone(record: Dict[str, Any]) -> bool:
+    return bool(record.get("is_deleted") or record.get("deleted_at"))
+
+
+class RecordStore:
+    """Local copy of the records kept current with delta fetches
+
+    The store remembers the newest updated_at/created_at it has seen and
+    asks only for records changed since then. Records are upserted by id
+    and tombstones remove them. Every reconcile_interval seconds a full
+    reload replaces the store, which also drops records deleted upstream
+    without a tombstone.
+
+    Delta fetches rely on the API honouring the cursor. If an incremental
+    fetch returns records older than the cursor, the filter was ignored, so
+    the store stops asking for deltas and does full reloads instead.
+    """
+
+    def __init__(self, reconcile_interval: float = RECONCILE_INTERVAL,
+                 retry_interval: float = SYNC_RETRY_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self.retry_interval = retry_interval
+        self.cursor: Optional[str] = None
+        self.supports_delta = True
+        self.synced_at = 0.0
+        self.reconciled_at = 0.0
+        self.failed_at = 0.0
+        self.last_error: Optional[BaseException] = None
+        self._cursor_time: Optional[datetime] = None
+        self._records: Dict[Any, Dict[str, Any]] = {}
+        # Ids added locally that no sync has returned yet
+        self._pending: set = set()
+        self._list: Optional[List[Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def loaded(self) -> bool:
+        """Whether a sync has ever succeeded; until then the store is not the record set"""
+        return self.synced_at > 0
+
+    @property
+    def records(self) -> List[Dict[str, Any]]:
+        """Get the records in insertion order; the list is rebuilt only after changes"""
+        with self._lock:
+            if self._list is None:
+                self._list = list(self._records.values())
+            return self._list
+
+    def _advance_cursor(self, record: Dict[str, Any]):
+        # Compared as datetimes, since the API's format may vary ("Z" vs "+00:00")
+        version = record_version(record)
+        version_time = parse_timestamp(version)
+        if version_time is not None and (self._cursor_time is None or version_time > self._cursor_time):
+            self.cursor, self._cursor_time = version, version_time
+
+    def add(self, record: Dict[str, Any]):
+        """Add a record created locally, e.g. right after a submission
+
+        When a sync first returns the server's copy, its fields are merged
+        into this record in place and it is not reported as updated, so
+        caches patched with the local record stay valid.
+        """
+        with self._lock:
+            is_new = record["id"] not in self._records
+            self._records[record["id"]] = record
+            self._pending.add(record["id"])
+            if is_new and self._list is not None:
+                self._list.append(record)
+            else:
+                self._list = None
+
+    def sync(self, fetch: Callable[[Optional[str]], Iterable[Dict[str, Any]]],
+             full: bool = False, wait: bool = False) -> Optional[Dict[str, Any]]:
+        """Pull changes with fetch(cursor) and return what changed
+
+        fetch receives the cursor, or None for a full reload, and yields
+        records changed at or after it. It must raise on errors rather than
+        end early, or a full reload would drop the records it missed.
+        Returns {"added", "updated", "removed", "full"}, or None if another
+        thread is already syncing. With wait, the call instead waits for
+        that thread and returns None if it succeeded, or raises its error.
+        Errors are re-raised and leave synced_at unchanged.
+        """
+        started = time.monotonic()
+        if not self._sync_lock.acquire(blocking=wait):
+            return None
+        try:
+            if wait and self.synced_at >= started:
+                return None
+            if wait and self.failed_at >= started:
+                raise self.last_error
+            full = full or self.cursor is None or not self.supports_delta or (
+                time.monotonic() - self.reconciled_at >= self.reconcile_interval
+            )
+            try:
+                if full:
+                    changes = self._reload(fetch(None))
+                    self.reconciled_at = time.monotonic()
+                else:
+                    cursor_time = self._cursor_time
+                    changes = self._apply(self._check_delta(fetch(self.cursor), cursor_time))
+            except Exception as e:
+                self.failed_at = time.monotonic()
+                self.last_error = e
+                raise
+            changes["full"] = full
+            self.synced_at = time.monotonic()
+            return changes
+        finally:
+            self._sync_lock.release()
+
+    def sync_if_due(self, fetch: Callable[[Optional[str]], Iterable[Dict[str, Any]]],
+                    interval: float) -> Optional[Dict[str, Any]]:
+        """Sync when the last successful sync is older than interval seconds
+
+        Failed syncs are retried after retry_interval. Until a sync has
+        succeeded, callers wait for an in-flight sync and a failure is
+        raised, so an empty store is never mistaken for the record set.
+        """
+        now = time.monotonic()
+        if self.loaded and now - self.synced_at < interval:
+            return None
+        if self.failed_at and now - self.failed_at < self.retry_interval:
+            if not self.loaded:
+                raise self.last_error
+            return None
+        return self.sync(fetch, wait=not self.loaded)
+
+    def _check_delta(self, incoming: Iterable[Dict[str, Any]],
+                     cursor_time: Optional[datetime]) -> Iterable[Dict[str, Any]]:
+        """Pass records through, noticing when the API ignored the cursor"""
+        for record in incoming:
+            version_time = parse_timestamp(record_version(record))
+            if self.supports_delta and cursor_time is not None and version_time is not None \
+                    and version_time < cursor_time:
+                print("The records API ignored updated_since; falling back to full reloads")
+                self.supports_delta = False
+            yield record
+
+    def _apply(self, incoming: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        added, updated, removed = [], [], []
+        for record in incoming:
+            record_id = record.get("id")
+            if record_id is None:
+                continue
+            with self._lock:
+                self._advance_cursor(record)
+                existing = self._records.get(record_id)
+                pending = record_id in self._pending
+                self._pending.discard(record_id)
+                if is_tombstone(record):
+                    if existing is not None:
+                        del self._records[record_id]
+                        removed.append(record_id)
+                        self._list = None
+                elif existing is None:
+                    self._records[record_id] = record
+                    added.append(record)
+                    if self._list is not None:
+                        self._list.append(record)
+                elif pending:
+                    # The server's copy of a local add: same record, with the server's fields
+                    existing.update({k: v for k, v in record.items() if v is not None})
+                elif existing != record:
+                    # Keep fields derived locally, such as the nearest place
+                    merged = dict(existing)
+                    merged.update({k: v for k, v in record.items() if v is not None})
+                    if merged != existing:
+                        self._records[record_id] = merged
+                        updated.append(merged)
+                        self._list = None
+        return {"added": added, "updated": updated, "removed": removed}
+
+    def _reload(self, incoming: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        seen = set()
+
+        def tracked():
+            for record in incoming:
+                seen.add(record.get("id"))
+                yield record
+
+        changes = self._apply(tracked())
+        with self._lock:
+            missing = [record_id for record_id in self._records if record_id not in seen]
+            for record_id in missing:
+                del self._records[record_id]
+                self._pending.discard(record_id)
+            if missing:
+                self._list = None
+        changes["removed"].extend(missing)
+        return changes
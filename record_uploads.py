@@ -0,0 +1,358 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_SPOOL_DIR = os.path.join(BASE_DIR, "uploads", "spool")
+MEDIA_DIR = os.path.join(BASE_DIR, "uploads", "media")
+
+# Chunk size clients get when they do not ask for one, and the allowed range
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024
+# Bytes read from the request stream per write, bounding memory per upload
+STREAM_BUFFER_SIZE = 64 * 1024
+# Seconds an unfinished upload session is kept for resuming
+UPLOAD_SESSION_TTL = 24 * 60 * 60
+# Seconds between sweeps for expired sessions, run lazily when a session is created
+UPLOAD_EXPIRE_INTERVAL = 60 * 60
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """An upload request that cannot be honored; carries the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def safe_filename(filename: str) -> str:
+    """Reduce a client supplied filename to a safe basename"""
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    name = re.sub(r"[^\w.\-]", "_", name).lstrip(".")
+    return name[:128] or "upload"
+
+
+def stream_to_file(stream: BinaryIO, f: BinaryIO, hasher: Any = None,
+                   limit: Optional[int] = None,
+                   buffer_size: int = STREAM_BUFFER_SIZE) -> int:
+    """Copy stream into f in fixed-size buffers, hashing in the same pass
+
+    Returns the number of bytes written. Raises UploadError if the stream
+    carries more than limit bytes.
+    """
+    written = 0
+    while True:
+        buffer = stream.read(buffer_size)
+        if not buffer:
+            return written
+        written += len(buffer)
+        if limit is not None and written > limit:
+            raise UploadError("Body is larger than declared", 413)
+        if hasher is not None:
+            hasher.update(buffer)
+        f.write(buffer)
+
+
+def store_stream(stream: BinaryIO, filename: str, media_dir: str = MEDIA_DIR,
+                 limit: int = MAX_UPLOAD_SIZE) -> Dict[str, Any]:
+    """Stream a whole upload body into the media directory
+
+    The body is written to a temporary file in fixed-size buffers and
+    hashed in the same pass, then renamed into place, so memory use does
+    not grow with the file size. Returns the stored name, path, size and
+    SHA-256.
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    stored_name = f"{uuid.uuid4().hex}_{safe_filename(filename)}"
+    path = os.path.join(media_dir, stored_name)
+    tmp_path = path + ".part"
+    hasher = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            size = stream_to_file(stream, f, hasher, limit=limit)
+        if size == 0:
+            raise UploadError("Upload body is empty")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {"stored_name": stored_name, "path": path, "size": size, "sha256": hasher.hexdigest()}
+
+
+class UploadSessions:
+    """Resumable chunked uploads spooled to disk
+
+    An upload session fixes the file size and chunk size up front, so
+    chunk i always lands at offset i * chunk_size. Chunks can therefore
+    arrive in any order and in parallel; each is streamed straight into a
+    preallocated spool file and checked against its SHA-256. The set of
+    received chunks is persisted next to the spool file, so a client that
+    lost its connection asks for the missing chunks and resends only those.
+    Directories are created on first write, so constructing one has no
+    side effects.
+    """
+
+    def __init__(self, spool_dir: str = UPLOAD_SPOOL_DIR, media_dir: str = MEDIA_DIR,
+                 session_ttl: float = UPLOAD_SESSION_TTL,
+                 expire_interval: float = UPLOAD_EXPIRE_INTERVAL):
+        self.spool_dir = spool_dir
+        self.media_dir = media_dir
+        self.session_ttl = session_ttl
+        self.expire_interval = expire_interval
+        self._lock = threading.Lock()
+        self._session_locks: Dict[str, threading.Lock] = {}
+        # Chunk writes in progress per session; finalize waits for none
+        self._writers: Dict[str, int] = {}
+        self._expired_at = 0.0
+
+    def _paths(self, upload_id: str):
+        if not _UPLOAD_ID.match(upload_id or ""):
+            raise UploadError("Unknown upload", 404)
+        base = os.path.join(self.spool_dir, upload_id)
+        return base + ".part", base + ".json"
+
+    def _session_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._session_locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id: str) -> Dict[str, Any]:
+        _, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Unknown upload", 404) from None
+
+    def _save(self, session: Dict[str, Any]):
+        _, meta_path = self._paths(session["upload_id"])
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session, f)
+        os.replace(tmp_path, meta_path)
+
+    def create(self, filename: str, total_size: int, chunk_size: Optional[int] = None,
+               sha256: Optional[str] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Start an upload session and preallocate its spool file"""
+        chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        if not 0 < total_size <= MAX_UPLOAD_SIZE:
+            raise UploadError("total_size is out of range", 413 if total_size > 0 else 400)
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise UploadError(f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE}")
+
+        self.expire_if_due()
+        os.makedirs(self.spool_dir, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        part_path, _ = self._paths(upload_id)
+        with open(part_path, "wb") as f:
+            f.truncate(total_size)
+
+        session = {
+            "upload_id": upload_id,
+            "filename": safe_filename(filename),
+            "total_size": total_size,
+            "chunk_size": chunk_size,
+            "total_chunks": -(-total_size // chunk_size),
+            "sha256": sha256.lower() if sha256 else None,
+            "received": {},
+            "metadata": metadata or {},
+            "created_at": time.time(),
+        }
+        self._save(session)
+        return self.status(upload_id, session)
+
+    def status(self, upload_id: str, session: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Get the progress of an upload, including the chunks still missing"""
+        session = session or self._load(upload_id)
+        received = {int(index) for index in session["received"]}
+        return {
+            "upload_id": session["upload_id"],
+            "filename": session["filename"],
+            "total_size": session["total_size"],
+            "chunk_size": session["chunk_size"],
+            "total_chunks": session["total_chunks"],
+            "received_chunks": len(received),
+            "missing_chunks": [i for i in range(session["total_chunks"]) if i not in received],
+        }
+
+    def chunk_length(self, session: Dict[str, Any], index: int) -> int:
+        if not 0 <= index < session["total_chunks"]:
+            raise UploadError("Chunk index is out of range")
+        start = index * session["chunk_size"]
+        return min(session["chunk_size"], session["total_size"] - start)
+
+    def write_chunk(self, upload_id: str, index: int, stream: BinaryIO,
+                    sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Stream one chunk into place and record it once its size and checksum match
+
+        Re-sending a chunk overwrites it, so retries are always safe. Chunks
+        of one session are written in parallel, but never while the session
+        is being finalized: either side then fails with 409.
+        """
+        with self._session_lock(upload_id):
+            session = self._load(upload_id)
+            if session.get("stored_name"):
+                raise UploadError("Upload is already being finalized", 409)
+            expected_length = self.chunk_length(session, index)
+            self._writers[upload_id] = self._writers.get(upload_id, 0) + 1
+        part_path, _ = self._paths(upload_id)
+
+        hasher = hashlib.sha256()
+        error = None
+        written = 0
+        try:
+            with open(part_path, "r+b") as f:
+                f.seek(index * session["chunk_size"])
+                written = stream_to_file(stream, f, hasher, limit=expected_length)
+        except UploadError as e:
+            error = e
+        except FileNotFoundError:
+            # Aborted or expired while this chunk was on its way
+            error = UploadError("Upload is no longer accepting chunks", 409)
+        except BaseException as e:
+            error = e
+        digest = hasher.hexdigest()
+        if error is None and written != expected_length:
+            error = UploadError(f"Chunk {index} has {written} bytes, expected {expected_length}")
+        elif error is None and sha256 and sha256.lower() != digest:
+            error = UploadError(f"Checksum mismatch for chunk {index}", 422)
+
+        with self._session_lock(upload_id):
+            self._writers[upload_id] -= 1
+            if not self._writers[upload_id]:
+                del self._writers[upload_id]
+            try:
+                session = self._load(upload_id)
+            except UploadError:
+                session = None
+            if session is not None:
+                if error is None:
+                    session["received"][str(index)] = digest
+                else:
+                    # The bytes on disk are no longer the ones received earlier
+                    session["received"].pop(str(index), None)
+                self._save(session)
+        if error is not None:
+            raise error
+        if session is None:
+            raise UploadError("Unknown upload", 404)
+        return self.status(upload_id, session)
+
+    def finalize(self, upload_id: str) -> Dict[str, Any]:
+        """Check that every chunk arrived and move the file into the media directory
+
+        Returns the session with the stored "path" and whole-file "sha256".
+        The session is kept until the caller has saved its record: call
+        complete() after that succeeds, or release() to move the file back
+        so the client can finalize again. Finalizing a session that is
+        already being finalized fails with 409.
+        """
+        with self._session_lock(upload_id):
+            session = self._load(upload_id)
+            if session.get("stored_name"):
+                raise UploadError("Upload is already being finalized", 409)
+            if self._writers.get(upload_id):
+                raise UploadError("Chunks of this upload are still being written", 409)
+            status = self.status(upload_id, session)
+            if status["missing_chunks"]:
+                raise UploadError("Upload is incomplete", 409)
+
+            part_path, _ = self._paths(upload_id)
+            hasher = hashlib.sha256()
+            with open(part_path, "rb") as f:
+                for buffer in iter(lambda: f.read(STREAM_BUFFER_SIZE), b""):
+                    hasher.update(buffer)
+            digest = hasher.hexdigest()
+            if session["sha256"] and session["sha256"] != digest:
+                raise UploadError("Checksum mismatch for the assembled file", 422)
+
+            stored_name = f"{upload_id}_{session['filename']}"
+            path = os.path.join(self.media_dir, stored_name)
+            os.makedirs(self.media_dir, exist_ok=True)
+            shutil.move(part_path, path)
+            session["stored_name"] = stored_name
+            self._save(session)
+
+        return dict(session, path=path, stored_name=stored_name, sha256=digest)
+
+    def complete(self, upload_id: str):
+        """Remove a finalized session once its record is saved; the media file stays"""
+        _, meta_path = self._paths(upload_id)
+        with self._session_lock(upload_id):
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+        with self._lock:
+            self._session_locks.pop(upload_id, None)
+
+    def release(self, upload_id: str):
+        """Undo finalize after the record could not be saved
+
+        The file goes back to the spool so the session can be finalized again.
+        """
+        part_path, _ = self._paths(upload_id)
+        with self._session_lock(upload_id):
+            try:
+                session = self._load(upload_id)
+            except UploadError:
+                session = None
+            stored_name = session.get("stored_name") if session else None
+            if not stored_name:
+                return
+            path = os.path.join(self.media_dir, stored_name)
+            if os.path.exists(path):
+                shutil.move(path, part_path)
+            session.pop("stored_name")
+            self._save(session)
+
+    def abort(self, upload_id: str):
+        """Discard an upload session and its spooled data"""
+        for path in self._paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+        with self._lock:
+            self._session_locks.pop(upload_id, None)
+
+    def expire(self) -> List[str]:
+        """Remove sessions older than session_ttl; returns their ids
+
+        Sessions being finalized are left alone; their file already
+        belongs to a record that is being saved.
+        """
+        expired = []
+        cutoff = time.time() - self.session_ttl
+        try:
+            names = os.listdir(self.spool_dir)
+        except FileNotFoundError:
+            return expired
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            try:
+                session = self._load(upload_id)
+                if session["created_at"] < cutoff and not session.get("stored_name"):
+                    self.abort(upload_id)
+                    expired.append(upload_id)
+            except (UploadError, ValueError, KeyError):
+                continue
+        return expired
+
+    def expire_if_due(self) -> List[str]:
+        """Run expire() at most once per expire_interval"""
+        with self._lock:
+            now = time.monotonic()
+            if self._expired_at and now - self._expired_at < self.expire_interval:
+                return []
+            self._expired_at = now
+        return self.expire()
@@ -0,0 +1,82 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class TaggedCache:
+    """Process-wide cache whose entries can be invalidated or updated by tag
+
+    Entries are loaded on demand and carry a set of tags such as "records".
+    A write that affects a tag can either drop the tagged entries or patch
+    them in place, so unrelated entries (geocodes, categories) stay warm.
+    Each tag has a generation that every invalidate or update bumps; a
+    value loaded while its tag changed is returned but not stored, since
+    it may predate the change and would never be patched.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], tags: Iterable[str] = (),
+                    ttl: Optional[float] = None) -> Any:
+        """Get a cached value, calling loader on a miss or after ttl seconds"""
+        tags = frozenset(tags)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry["expires"] is None or entry["expires"] > time.monotonic()):
+                return entry["value"]
+            generations = self._tag_generations(tags)
+
+        value = loader()
+        with self._lock:
+            if self._tag_generations(tags) == generations:
+                self.set(key, value, tags, ttl)
+        return value
+
+    def _tag_generations(self, tags: Iterable[str]) -> Dict[str, int]:
+        return {tag: self._generations.get(tag, 0) for tag in tags}
+
+    def _bump(self, tag: str):
+        self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = {
+                "value": value,
+                "tags": frozenset(tags),
+                "expires": time.monotonic() + ttl if ttl is not None else None,
+            }
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry["value"] if entry is not None else default
+
+    def invalidate(self, tag: str):
+        """Drop every entry carrying tag"""
+        with self._lock:
+            self._bump(tag)
+            for key in [k for k, e in self._entries.items() if tag in e["tags"]]:
+                del self._entries[key]
+
+    def update(self, tag: str, updaters: Dict[str, Callable[[Any], Any]]):
+        """Patch entries carrying tag in place and drop the ones without an updater
+
+        Each updater receives the cached value and returns the new one.
+        """
+        with self._lock:
+            self._bump(tag)
+            for key, entry in list(self._entries.items()):
+                if tag not in entry["tags"]:
+                    continue
+                updater = updaters.get(key)
+                if updater is None:
+                    del self._entries[key]
+                else:
+                    entry["value"] = updater(entry["value"])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import weakref
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+import api_async
+
+
+class FakeAuth:
+    """Records the threads its blocking token methods run on"""
+
+    def __init__(self, access_token="token", refreshed_token="token"):
+        self.access_token = access_token
+        self.refreshed_token = refreshed_token
+        self.threads = []
+
+    def ensure_fresh_token(self):
+        self.threads.append(threading.current_thread())
+
+    def refresh_rejected_token(self, token):
+        self.threads.append(threading.current_thread())
+        self.access_token = self.refreshed_token
+        return True
+
+
+def handle(request):
+    assert request.headers["Authorization"] == "Bearer token"
+    path = request.url.path
+    if path.endswith("/categories/"):
+        return httpx.Response(200, json=[{"id": "c1"}])
+    if path.endswith("/records/"):
+        return httpx.Response(200, json=[{"uid": request.url.params.get("user_id", "any")}])
+    if path.endswith("/records/r1"):
+        return httpx.Response(200, json={"uid": "r1", "file_url": "/media/r1.png"})
+    if path.endswith("/media/r1.png"):
+        return httpx.Response(200, content=b"png")
+    if path.endswith("/auth/me"):
+        return httpx.Response(200, json={"name": "Asha"})
+    return httpx.Response(500)
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Serve requests with handler and count the AsyncClients created"""
+    created = []
+
+    def use(handler):
+        def create_client():
+            created.append(1)
+            return httpx.AsyncClient(base_url="http://api.test/api/v1",
+                                     transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(api_async, "create_client", create_client)
+        monkeypatch.setattr(api_async, "_clients", weakref.WeakKeyDictionary())
+        return created
+
+    return use
+
+
+def test_gather_page_data_runs_calls_concurrently(clients):
+    expected = 4
+    arrived = []
+    state = {}
+
+    async def handler(request):
+        # Every call waits until all have started, which only happens if they overlap
+        all_started = state.setdefault("event", asyncio.Event())
+        arrived.append(request.url.path)
+        if len(arrived) == expected:
+            all_started.set()
+        await asyncio.wait_for(all_started.wait(), 5)
+        return handle(request)
+
+    clients(handler)
+    results = api_async.gather_page_data(FakeAuth(), include_records=True, user_id="u1",
+                                         user_records_limit=50)
+
+    assert results == {
+        "categories": [{"id": "c1"}],
+        "current_user": {"name": "Asha"},
+        "records": [{"uid": "any"}],
+        "user_records": [{"uid": "u1"}],
+    }
+    assert len(arrived) == expected
+
+
+def test_media_of_random_record_and_client_reuse(clients):
+    created = clients(handle)
+
+    first = api_async.gather_page_data(FakeAuth(), include_categories=False,
+                                       include_current_user=False, random_record_id="r1")
+    second = api_async.gather_page_data(FakeAuth(), include_current_user=False)
+
+    assert first == {"random_record_media": b"png"}
+    assert second == {"categories": [{"id": "c1"}]}
+    assert len(created) == 1
+
+
+def test_rejected_token_is_refreshed_on_the_calling_thread_and_retried(clients):
+    seen_tokens = []
+
+    def handler(request):
+        seen_tokens.append(request.headers["Authorization"])
+        if request.headers["Authorization"] != "Bearer token":
+            return httpx.Response(401, json={"detail": "revoked"})
+        return handle(request)
+
+    clients(handler)
+    auth = FakeAuth(access_token="revoked")
+    results = api_async.gather_page_data(auth, include_current_user=False, include_records=True)
+
+    assert results == {"categories": [{"id": "c1"}], "records": [{"uid": "any"}]}
+    assert seen_tokens.count("Bearer revoked") == 2 and seen_tokens.count("Bearer token") == 2
+    # Blocking token work never runs on the shared event loop thread
+    assert auth.threads == [threading.current_thread()] * 2
+
+
+def test_gather_calls_isolates_failures(clients):
+    clients(lambda request: httpx.Response(503) if request.url.path.endswith("/auth/me") else handle(request))
+
+    async def broken(auth, categories, records):
+        raise RuntimeError("boom")
+
+    results = api_async.run_sync(api_async.gather_calls("token", {
+        "broken": broken,
+        "categories": lambda auth, categories, records: categories.get_categories(),
+        "current_user": lambda auth, categories, records: auth.get_current_user(),
+    }))
+
+    assert results["broken"] == {"error": "boom"}
+    assert results["categories"] == [{"id": "c1"}]
+    # Failed requests come back as errors for the script thread to report
+    assert "503" in results["current_user"]["error"]
+    assert results["current_user"]["status"] == 503
+
+
+def test_run_sync_inside_running_loop():
+    async def outer():
+        return api_async.run_sync(asyncio.sleep(0, result=42))
+
+    assert asyncio.run(outer()) == 42
@@ -0,0 +1,163 @@
+import base64
+import json
+import threading
+import time
+
+import requests
+
+import api_auth
+
+
+def make_token(expires_in, tag="a"):
+    payload = base64.urlsafe_b64encode(
+        json.dumps({"exp": time.time() + expires_in, "tag": tag}).encode()
+    ).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+def make_response(status, body):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body).encode()
+    return response
+
+
+class FakeSession:
+    """Accepts only the newest token and counts /auth/refresh calls"""
+
+    def __init__(self, valid_token, refresh_delay=0.0):
+        self.valid_token = valid_token
+        self.refresh_delay = refresh_delay
+        self.refreshes = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, headers=None, json=None):
+        if url.endswith("/auth/refresh"):
+            time.sleep(self.refresh_delay)
+            with self.lock:
+                self.refreshes += 1
+                self.valid_token = make_token(3600, tag=str(self.refreshes))
+            return make_response(200, {"access_token": self.valid_token})
+        if headers.get("Authorization") != f"Bearer {self.valid_token}":
+            return make_response(401, {"detail": "expired"})
+        return make_response(200, {"ok": True})
+
+    def get(self, url, headers=None, params=None):
+        if headers.get("Authorization") != f"Bearer {self.valid_token}":
+            return make_response(401, {"detail": "expired"})
+        return make_response(200, [])
+
+
+def test_decode_token_expiry():
+    token = make_token(60)
+    assert abs(api_auth.decode_token_expiry(token) - (time.time() + 60)) < 2
+    assert api_auth.decode_token_expiry("not-a-jwt") is None
+    assert api_auth.decode_token_expiry(None) is None
+
+
+def test_401_triggers_one_refresh_and_retry():
+    auth = api_auth.CorpusAPIAuth()
+    auth.access_token = make_token(3600)
+    auth.session = FakeSession(valid_token="revoked")
+
+    assert auth._make_request("POST", "/records/", {}) == {"ok": True}
+    assert auth.session.refreshes == 1
+
+
+def test_categories_and_records_clients_refresh_on_401(monkeypatch):
+    import api_categories
+    import api_records_client
+
+    client = api_auth.CorpusAPIAuth()
+    client.access_token = make_token(3600)
+    client.session = FakeSession(valid_token="revoked")
+    monkeypatch.setattr(api_auth, "_fallback_client", client)
+
+    categories = api_categories.CorpusAPICategories()
+    categories.session = client.session
+    assert categories.get_categories() == []
+    assert client.session.refreshes == 1
+
+    client.session.valid_token = "rotated"
+    records = api_records_client.CorpusAPIRecordsClient()
+    records.session = client.session
+    assert records.get_records(limit=10) == []
+    assert client.session.refreshes == 2
+
+
+def test_expired_token_refresh_is_single_flight():
+    auth = api_auth.CorpusAPIAuth()
+    old_token = make_token(1)
+    auth.access_token = old_token
+    auth.session = FakeSession(valid_token=old_token, refresh_delay=0.1)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(auth._make_request("POST", "/x", {})))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [{"ok": True}] * 8
+    assert auth.session.refreshes == 1
+
+
+def test_token_near_expiry_refreshes_in_background():
+    auth = api_auth.CorpusAPIAuth()
+    old_token = make_token(60)
+    auth.access_token = old_token
+    auth.session = FakeSession(valid_token=old_token, refresh_delay=0.05)
+
+    auth.ensure_fresh_token()
+    assert auth.access_token == old_token
+
+    deadline = time.time() + 2
+    while auth.access_token == old_token and time.time() < deadline:
+        time.sleep(0.01)
+    assert auth.access_token != old_token
+    assert auth.session.refreshes == 1
+
+
+def test_current_user_cached_per_token_and_invalidated():
+    auth = api_auth.CorpusAPIAuth()
+    auth.access_token = "token-a"
+    calls = []
+    auth.get_current_user = lambda: calls.append(auth.access_token) or {"id": auth.access_token}
+
+    assert auth.get_current_user_cached() == {"id": "token-a"}
+    assert auth.get_current_user_cached() == {"id": "token-a"}
+    assert calls == ["token-a"]
+
+    auth.access_token = "token-b"
+    assert auth.get_current_user_cached() == {"id": "token-b"}
+
+    auth._make_request = lambda *args, **kwargs: {"message": "ok"}
+    auth.change_password("old", "new")
+    assert auth.get_current_user_cached() == {"id": "token-b"}
+    assert calls == ["token-a", "token-b", "token-b"]
+
+    auth.logout()
+    assert not auth.has_cached_current_user()
+
+
+def test_proxy_resolves_to_each_sessions_own_client(monkeypatch):
+    class FakeStreamlit:
+        session_state = {}
+
+    monkeypatch.setattr(api_auth, "st", FakeStreamlit)
+    monkeypatch.setattr(api_auth, "_in_script_run", lambda: True)
+
+    first, second = {}, {}
+    FakeStreamlit.session_state = first
+    api_auth.api_auth.access_token = "first-token"
+    FakeStreamlit.session_state = second
+    api_auth.api_auth.access_token = "second-token"
+
+    FakeStreamlit.session_state = first
+    assert api_auth.api_auth.access_token == "first-token"
+    assert api_auth.get_api_auth() is first[api_auth.SESSION_CLIENT_KEY]
+    assert first[api_auth.SESSION_CLIENT_KEY].session is second[api_auth.SESSION_CLIENT_KEY].session
+    assert api_auth._fallback_client.access_token is None
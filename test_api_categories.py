@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+import api_categories
+
+CATEGORIES = [
+    {"id": "c1", "name": "dialects", "title": "Dialects", "published": True, "rank": 1},
+    {"id": "c2", "name": "food", "title": "Food", "published": True, "rank": 2},
+    {"id": "c3", "name": "drafts", "title": "Drafts", "published": False, "rank": 2},
+]
+
+
+class FakeSession:
+    """Serves the category list with an ETag and counts upstream GETs"""
+
+    def __init__(self, categories, delay=0.0):
+        self.categories = categories
+        self.delay = delay
+        self.etag = '"v1"'
+        self.gets = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, **kwargs):
+        with self.lock:
+            self.gets += 1
+        self.started.set()
+        self.release.wait(5)
+        response = requests.Response()
+        if headers.get("If-None-Match") == self.etag:
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = 200
+            response._content = json.dumps(self.categories).encode()
+            response.headers["ETag"] = self.etag
+        return response
+
+
+def make_client(categories=CATEGORIES, cache_ttl=300.0):
+    client = api_categories.CorpusAPICategories(cache_ttl=cache_ttl)
+    client.session = FakeSession(categories)
+    return client
+
+
+def test_cached_categories_are_served_without_requests():
+    client = make_client()
+    first = client.get_categories_cached()
+    assert client.get_categories_cached() is first
+    assert client.session.gets == 1
+    assert client.is_categories_cache_fresh()
+
+
+def test_expired_cache_revalidates_and_keeps_list_on_304():
+    client = make_client(cache_ttl=0.0)
+    first = client.get_categories_cached()
+    index = client.get_category_index()
+    assert client.session.gets == 2
+
+    # Same ETag: the cached list and its index are kept
+    assert client.get_categories_cached() is first
+    assert client.get_category_index() is index
+
+    client.session.etag = '"v2"'
+    client.session.categories = CATEGORIES[:1]
+    assert [c["id"] for c in client.get_categories_cached()] == ["c1"]
+    assert client.get_category_index() is not index
+
+
+def test_concurrent_callers_share_one_request():
+    client = make_client()
+    client.session.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.get_categories_cached()))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    assert client.session.started.wait(5)
+    # Let the others reach the in-flight fetch before it completes
+    time.sleep(0.05)
+    client.session.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert client.session.gets == 1
+    assert len(results) == 8 and all(r == CATEGORIES for r in results)
+
+
+def test_category_index_lookups_and_published_subset():
+    index = api_categories.CategoryIndex(CATEGORIES)
+
+    assert index.by_id["c3"]["name"] == "drafts"
+    assert [c["id"] for c in index.published] == ["c1", "c2"]
+    assert index.options == (("Select a category", None), ("Dialects", "c1"), ("Food", "c2"))
+    assert index.default_category["id"] == "c1"
+    assert index.statistics["unpublished_categories"] == 1
+    assert index.statistics["categories_by_rank"] == {1: 1, 2: 2}
+
+
+def test_category_lookups_cannot_change_the_shared_index(monkeypatch):
+    client = make_client()
+    monkeypatch.setattr(api_categories, "api_categories", client)
+    monkeypatch.setattr(api_categories.api_auth, "is_authenticated", lambda: True)
+
+    options = api_categories.get_category_options()
+    published = api_categories.get_published_categories()
+    assert isinstance(options, tuple) and isinstance(published, tuple)
+    assert [c["id"] for c in published] == ["c1", "c2"]
+
+    api_categories.get_category_by_id("c1")["title"] = "Changed"
+    assert api_categories.get_category_by_id("c1")["title"] == "Dialects"
+    assert api_categories.get_category_by_id("missing") is None
+
+    # Categories handed out directly are read-only views of the index's own copies
+    for category in (published[0], api_categories.get_default_category()):
+        with pytest.raises(TypeError):
+            category["title"] = "Changed"
+    with pytest.raises(TypeError):
+        client.get_category_index().by_id["c9"] = {}
+
+    source = [dict(category) for category in CATEGORIES]
+    index = api_categories.CategoryIndex(source)
+    source[0]["title"] = "Changed"
+    assert index.default_category["title"] == "Dialects"
@@ -0,0 +1,86 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import api_http
+from api_http import SingleFlight
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    """Concurrent calls with the same key share one execution and its result."""
+    flight = SingleFlight()
+    calls = []
+    start = threading.Barrier(5)
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"id": 1}
+
+    results = []
+
+    def worker():
+        start.wait()
+        results.append(flight.do("GET /categories/", fetch))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert all(result is results[0] for result in results)
+    assert flight.executions == 1 and flight.coalesced == 4
+
+
+def test_single_flight_shares_errors_and_does_not_cache():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "recovered") == "recovered"
+    assert flight.executions == 2
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_shared_session_reuses_connections():
+    """Sequential requests on the shared session reuse one keep-alive connection."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        session = api_http.get_session()
+        assert session is api_http.get_session()
+        url = f"http://127.0.0.1:{server.server_port}/categories/"
+        before = api_http.get_pool_stats()
+        for _ in range(3):
+            assert session.get(url).json() == []
+        after = api_http.get_pool_stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert after["requests"] - before["requests"] == 3
+    assert after["connections_opened"] - before["connections_opened"] == 1
+    assert after["reused_connections"] - before["reused_connections"] == 2
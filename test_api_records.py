@@ -0,0 +1,166 @@
+import importlib
+import io
+import json
+import os
+import sys
+import types
+
+import pytest
+
+flask = pytest.importorskip("flask")
+flask_sqlalchemy = pytest.importorskip("flask_sqlalchemy")
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+PACKAGE = "corpus_api_shim"
+
+
+def install_shim():
+    """Import api_records as a submodule of a package whose database is an in-memory SQLite app
+
+    api_records imports its models and siblings relatively; the shim
+    package points at the repository root and supplies database/models.
+    """
+    app = flask.Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db = flask_sqlalchemy.SQLAlchemy(app)
+
+    class Record(db.Model):
+        __tablename__ = "records"
+        id = db.Column(db.Integer, primary_key=True)
+        title = db.Column(db.String)
+        description = db.Column(db.String)
+        media_type = db.Column(db.String)
+        filename = db.Column(db.String)
+        total_chunks = db.Column(db.Integer)
+        latitude = db.Column(db.Float)
+        longitude = db.Column(db.Float)
+        category_id = db.Column(db.String)
+        user_id = db.Column(db.String)
+        release_rights = db.Column(db.String)
+        language = db.Column(db.String)
+
+        def to_dict(self):
+            return {column: getattr(self, column) for column in self.__table__.columns.keys()}
+
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+    database = types.ModuleType(f"{PACKAGE}.database")
+    database.app, database.db, database.Record = app, db, Record
+    models = types.ModuleType(f"{PACKAGE}.models")
+    models.Record = Record
+    sys.modules.update({PACKAGE: package, f"{PACKAGE}.database": database, f"{PACKAGE}.models": models})
+
+    # A database created before the list endpoint's indexes existed
+    with app.app_context():
+        Record.__table__.create(db.engine)
+    return importlib.import_module(f"{PACKAGE}.api_records"), app, db
+
+
+@pytest.fixture(scope="module")
+def api():
+    api_records, app, db = install_shim()
+    api_records.initialize_routes()
+    with app.app_context():
+        yield api_records, app.test_client(), db
+    for name in [name for name in sys.modules if name.startswith(PACKAGE)]:
+        del sys.modules[name]
+
+
+def test_initialize_routes_adds_missing_indexes(api):
+    api_records, client, db = api
+    # Read from the schema; reflection skips the expression index
+    with db.engine.connect() as connection:
+        names = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'").scalars())
+    assert {index.name for index in api_records.RECORD_INDEXES} <= names
+    # Indexes that already exist are left alone
+    api_records.ensure_record_indexes()
+
+
+def test_bulk_create_then_list_pages_with_cursor(api):
+    api_records, client, db = api
+    rows = [{"title": f"word {i}", "latitude": 17.0 + i, "longitude": 78.0,
+             "category_id": "c1" if i % 2 else "c2", "user_id": "u1"} for i in range(5)]
+    response = client.post("/api/v1/records/bulk", data="\n".join(json.dumps(r) for r in rows),
+                           content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert response.get_json()["counts"] == {"created": 5}
+
+    first = client.get("/api/v1/records/?category_id=c2&limit=2&fields=id,title").get_json()
+    assert [r["title"] for r in first["records"]] == ["word 0", "word 2"]
+    assert set(first["records"][0]) == {"id", "title"}
+    second = client.get(f"/api/v1/records/?category_id=c2&limit=2&cursor={first['next_cursor']}").get_json()
+    assert [r["title"] for r in second["records"]] == ["word 4"]
+    assert second["next_cursor"] is None
+
+    invalid = client.post("/api/v1/records/bulk", json=[{"title": "no coordinates"}])
+    assert invalid.status_code == 422
+    assert client.get("/api/v1/records/?limit=0").status_code == 400
+
+
+def test_failed_bulk_chunk_reports_generic_row_errors(api, monkeypatch, caplog):
+    api_records, client, db = api
+
+    def failing(chunk):
+        raise sqlalchemy.exc.IntegrityError("INSERT INTO records (secret) VALUES (?)", ("s3cret",), None)
+
+    monkeypatch.setattr(api_records.records_api, "_write_bulk_chunk", failing)
+    response = client.post("/api/v1/records/bulk", json=[{"id": 1, "title": "renamed"}])
+
+    assert response.status_code == 207
+    result = response.get_json()["results"][0]
+    assert result == {"index": 0, "status": "error", "error": api_records.BULK_CHUNK_ERROR}
+    assert "s3cret" not in response.get_data(as_text=True)
+    assert "s3cret" in caplog.text
+
+
+def test_create_record_validates_fields_before_storing_the_file(api, monkeypatch, tmp_path):
+    api_records, client, db = api
+    media_dir = tmp_path / "media"
+    monkeypatch.setattr(api_records.records_api, "_uploads",
+                        api_records.UploadSessions(str(tmp_path / "spool"), str(media_dir)))
+
+    rejected = client.post("/api/v1/records/?filename=a.png&title=Cycle", data=b"png",
+                           content_type="application/octet-stream")
+    assert rejected.status_code == 400
+    assert "Missing fields" in rejected.get_json()["error"]
+    rejected = client.post("/api/v1/records/", content_type="multipart/form-data", data={
+        "title": "Cycle", "latitude": "95", "longitude": "78", "category_id": "c1", "user_id": "u1",
+        "file": (io.BytesIO(b"png"), "a.png"),
+    })
+    assert rejected.status_code == 400
+    assert not media_dir.exists() or not list(media_dir.iterdir())
+
+    created = client.post("/api/v1/records/?filename=a.png&title=Cycle&latitude=17.4"
+                          "&longitude=78.5&category_id=c1&user_id=u1",
+                          data=b"png", content_type="application/octet-stream")
+    assert created.status_code == 201
+    assert len(list(media_dir.iterdir())) == 1
+
+
+def test_nearby_records_seek_the_latitude_band_index(api):
+    api_records, client, db = api
+    rows = [
+        {"title": "opera house", "latitude": -33.8568, "longitude": 151.2153},
+        {"title": "bondi", "latitude": -33.8915, "longitude": 151.2767},
+        {"title": "parramatta", "latitude": -33.8150, "longitude": 151.0011},
+    ]
+    response = client.post("/api/v1/records/bulk", json=[dict(row, category_id="c9", user_id="u1") for row in rows])
+    assert response.status_code == 200
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        result = client.get("/api/v1/records/nearby?lat=-33.8688&lon=151.2093&radius_km=10&fields=id,title")
+    finally:
+        sqlalchemy.event.remove(db.engine, "before_cursor_execute", capture)
+
+    records = result.get_json()["records"]
+    assert [r["title"] for r in records] == ["opera house", "bondi"]
+    statement, parameters = statements[0]
+    with db.engine.connect() as connection:
+        plan = " ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+    assert "COVERING INDEX ix_records_latitude_band_longitude" in plan
@@ -0,0 +1,119 @@
+import json
+import threading
+
+import pytest
+import requests
+
+import api_records_client
+
+
+class FakeSession:
+    """Serves total records in pages and records every requested page"""
+
+    def __init__(self, total, fail_at_skip=None):
+        self.fail_at_skip = fail_at_skip
+        self.records = [{"uid": str(i), "title": f"word {i}", "reviewed": i % 2 == 0,
+                         "location": {"latitude": 17.0, "longitude": 78.0}}
+                        for i in range(total)]
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, params=None):
+        with self.lock:
+            self.requests.append(dict(params))
+        if params["skip"] == self.fail_at_skip:
+            raise requests.exceptions.ConnectionError("connection reset")
+        page = self.records[params["skip"]:params["skip"] + params["limit"]]
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(page).encode()
+        return response
+
+
+def make_client(total, page_size):
+    client = api_records_client.CorpusAPIRecordsClient(page_size=page_size)
+    client.session = FakeSession(total)
+    return client
+
+
+def test_iter_records_pages_until_short_page():
+    client = make_client(total=25, page_size=10)
+
+    records = list(client.iter_records(user_id="u1"))
+
+    assert [r["uid"] for r in records] == [str(i) for i in range(25)]
+    assert [(p["skip"], p["limit"]) for p in client.session.requests] == [(0, 10), (10, 10), (20, 10)]
+    assert all(p["user_id"] == "u1" for p in client.session.requests)
+
+
+def test_iter_records_prefetches_next_page_and_respects_limit():
+    client = make_client(total=100, page_size=10)
+
+    iterator = client.iter_records(limit=25)
+    first = next(iterator)
+    # The second page is requested while the first is being consumed
+    for _ in range(100):
+        if len(client.session.requests) == 2:
+            break
+        threading.Event().wait(0.01)
+    assert first["uid"] == "0"
+    assert len(client.session.requests) == 2
+
+    rest = list(iterator)
+    assert len(rest) == 24
+    assert client.session.requests[-1] == {"skip": 20, "limit": 5}
+
+
+def test_iter_records_raises_instead_of_stopping_early():
+    client = make_client(total=25, page_size=10)
+    client.session.fail_at_skip = 10
+
+    received = []
+    with pytest.raises(requests.exceptions.ConnectionError):
+        for record in client.iter_records():
+            received.append(record)
+    assert len(received) == 10
+
+
+def test_to_map_record_flattens_location():
+    record = api_records_client.to_map_record(
+        {"uid": "r1", "title": "Cycle", "location": {"latitude": 19.07, "longitude": 72.87},
+         "reviewed": True}
+    )
+    assert record["id"] == "r1"
+    assert record["dialect_word"] == "Cycle"
+    assert (record["latitude"], record["longitude"]) == (19.07, 72.87)
+    assert record["is_verified"] is True
+
+
+class MediaSession:
+    """Serves one record whose file_url points at its image"""
+
+    def __init__(self):
+        self.requests = []
+
+    def get(self, url, headers=None, params=None):
+        self.requests.append((url, headers.get("Authorization")))
+        response = requests.Response()
+        response.status_code = 200
+        if url.endswith("/records/r1"):
+            response._content = json.dumps({"uid": "r1", "file_url": "/media/r1.png"}).encode()
+        else:
+            response._content = b"\x89PNG image"
+        return response
+
+
+def test_get_image_from_api_uses_the_given_client(monkeypatch):
+    import api_auth
+
+    auth = api_auth.CorpusAPIAuth()
+    auth.access_token = "session-token"
+    session = MediaSession()
+    monkeypatch.setattr(api_records_client.api_records, "session", session)
+
+    image = api_records_client.get_image_from_api("r1", auth=auth)
+
+    assert image == b"\x89PNG image"
+    assert session.requests[0][0].endswith("/api/v1/records/r1")
+    assert session.requests[1][0] == "https://api.corpus.swecha.org/media/r1.png"
+    assert {token for _, token in session.requests} == {"Bearer session-token"}
@@ -0,0 +1,164 @@
+import json
+import weakref
+
+import pytest
+import requests
+
+import streamlit as st
+
+import api_async
+import api_http
+import geo_index
+import record_store
+
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+RECORDS = [
+    {"uid": "r1", "title": "Cycle", "description": "Mumbai, Maharashtra", "user_id": "u1",
+     "location": {"latitude": 19.07, "longitude": 72.87}, "reviewed": True,
+     "created_at": "2025-01-01T00:00:00Z", "updated_at": "2025-01-01T00:00:00Z"},
+    {"uid": "r2", "title": "Baingan", "description": "Hyderabad, Telangana", "user_id": "u1",
+     "location": {"latitude": 17.38, "longitude": 78.48}, "reviewed": False,
+     "created_at": "2025-01-02T00:00:00Z", "updated_at": "2025-01-02T00:00:00Z"},
+]
+# Authorization headers of single-record requests, e.g. from the image prefetch workers
+RECORD_REQUESTS = []
+CATEGORIES = [{"id": "c1", "name": "dialect", "title": "Dialect", "published": True, "rank": 1}]
+
+
+def fake_send(adapter, request, **kwargs):
+    """Answer API requests of the shared session from fixtures instead of the network"""
+    path = request.path_url.split("?")[0]
+    if path.endswith("/records/"):
+        body = RECORDS if "skip=0" in request.path_url else []
+    elif path.endswith("/categories/"):
+        body = CATEGORIES
+    elif path.endswith("/auth/me"):
+        body = {"id": "u1", "name": "Test User"}
+    elif "/records/" in path:
+        RECORD_REQUESTS.append(request.headers.get("Authorization"))
+        body = {"uid": path.rsplit("/", 1)[-1]}
+    else:
+        body = {}
+    response = requests.Response()
+    response.status_code = 200
+    response._content = json.dumps(body).encode()
+    response.headers["Content-Type"] = "application/json"
+    response.url = request.url
+    response.request = request
+    return response
+
+
+@pytest.fixture
+def offline_api(monkeypatch):
+    monkeypatch.setattr(api_http.TimeoutHTTPAdapter, "send", fake_send)
+    monkeypatch.setattr(api_async, "is_available", lambda: False)
+    # The record store and derived caches are process-wide; start every test empty
+    st.cache_resource.clear()
+    RECORD_REQUESTS.clear()
+
+
+def test_app_renders_without_login(offline_api):
+    at = AppTest.from_file("app.py", default_timeout=30).run()
+    assert not at.exception
+
+
+def test_app_renders_authenticated(offline_api):
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.session_state["api_auth_token"] = "test-token"
+    at.run()
+
+    assert not at.exception
+    metrics = {metric.label: metric.value for metric in at.metric}
+    assert metrics["Total Contributions"] == "2"
+    assert metrics["Your Contributions"] == "2"
+    assert metrics["Verified Records"] == "1"
+    # Popup images are fetched on worker threads with the session's own token
+    assert RECORD_REQUESTS and set(RECORD_REQUESTS) == {"Bearer test-token"}
+
+
+def test_app_falls_back_to_demo_data_when_records_never_load(offline_api, monkeypatch):
+    def records_down(adapter, request, **kwargs):
+        if request.path_url.split("?")[0].endswith("/records/"):
+            raise requests.exceptions.ConnectionError("API down")
+        return fake_send(adapter, request, **kwargs)
+
+    monkeypatch.setattr(api_http.TimeoutHTTPAdapter, "send", records_down)
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.session_state["api_auth_token"] = "test-token"
+    at.run()
+
+    assert not at.exception
+    assert any("API temporarily unavailable" in warning.value for warning in at.warning)
+    metrics = {metric.label: metric.value for metric in at.metric}
+    assert metrics["Total Contributions"] == "Unavailable"
+
+
+def test_demo_points_stay_out_of_the_real_heatmap(offline_api, monkeypatch):
+    binned = {}
+    add_records = geo_index.DensityGrids.add_records
+
+    def tracking_add_records(grids, records):
+        records = list(records)
+        binned.setdefault(id(grids), set()).update(record["id"] for record in records)
+        binned["last"] = id(grids)
+        return add_records(grids, records)
+
+    def records_down(adapter, request, **kwargs):
+        if request.path_url.split("?")[0].endswith("/records/"):
+            raise requests.exceptions.ConnectionError("API down")
+        return fake_send(adapter, request, **kwargs)
+
+    monkeypatch.setattr(geo_index.DensityGrids, "add_records", tracking_add_records)
+    # Retry the failed first sync on the next run instead of after SYNC_RETRY_INTERVAL
+    monkeypatch.setattr(record_store.RecordStore.__init__, "__defaults__",
+                        (record_store.RECONCILE_INTERVAL, 0))
+    monkeypatch.setattr(api_http.TimeoutHTTPAdapter, "send", records_down)
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.session_state["api_auth_token"] = "test-token"
+    at.run()
+    assert any(record_id.startswith("demo_") for record_id in binned[binned["last"]])
+
+    # The API is back: the heatmap must be built from the real records only
+    monkeypatch.setattr(api_http.TimeoutHTTPAdapter, "send", fake_send)
+    at.run()
+    assert not at.exception
+    assert binned[binned["last"]] == {"r1", "r2"}
+
+
+def test_app_uses_async_prefetch_for_page_data(offline_api, monkeypatch):
+    httpx = pytest.importorskip("httpx")
+    sync_paths = []
+
+    def tracking_send(adapter, request, **kwargs):
+        sync_paths.append(request.path_url)
+        return fake_send(adapter, request, **kwargs)
+
+    def handler(request):
+        assert request.headers["Authorization"] == "Bearer test-token"
+        path = request.url.path
+        if path.endswith("/records/"):
+            return httpx.Response(200, json=RECORDS)
+        if path.endswith("/categories/"):
+            return httpx.Response(200, json=CATEGORIES)
+        if path.endswith("/auth/me"):
+            return httpx.Response(200, json={"id": "u1", "name": "Test User"})
+        return httpx.Response(200, json={"uid": path.rsplit("/", 1)[-1]})
+
+    monkeypatch.setattr(api_http.TimeoutHTTPAdapter, "send", tracking_send)
+    monkeypatch.setattr(api_async, "is_available", lambda: True)
+    monkeypatch.setattr(api_async, "create_client", lambda: httpx.AsyncClient(
+        base_url="http://api.test/api/v1", transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(api_async, "_clients", weakref.WeakKeyDictionary())
+
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.session_state["api_auth_token"] = "test-token"
+    at.session_state["api_user_info"] = {"user_id": "u1"}
+    at.run()
+
+    assert not at.exception
+    metrics = {metric.label: metric.value for metric in at.metric}
+    assert metrics["Your Contributions"] == "2"
+    # The user's records, categories and profile came from the concurrent round
+    assert not [path for path in sync_paths if "user_id=" in path or "/categories/" in path
+                or "/auth/me" in path]
@@ -0,0 +1,84 @@
+from geo_index import DensityGrids, GridIndex, bbox_around, cluster_records, haversine_km, within_radius
+
+RECORDS = [
+    {"id": "hyd", "latitude": 17.385, "longitude": 78.4867},
+    {"id": "sec", "latitude": 17.4399, "longitude": 78.4983},
+    {"id": "mum", "latitude": 19.076, "longitude": 72.8777},
+    {"id": "del", "latitude": 28.6139, "longitude": 77.209},
+    {"id": "none", "latitude": None, "longitude": None},
+]
+
+
+def test_grid_index_bbox_query():
+    """Bounding box queries return exactly the records inside the box."""
+    index = GridIndex.from_records(RECORDS, cell_size=0.25)
+    assert len(index) == 4
+
+    deccan = index.query_bbox(15.0, 72.0, 20.0, 80.0)
+    assert {record["id"] for record in deccan} == {"hyd", "sec", "mum"}
+
+    hyderabad = index.query_bbox(17.3, 78.4, 17.4, 78.5)
+    assert [record["id"] for record in hyderabad] == ["hyd"]
+
+    everything = index.query_bbox(-90, -180, 90, 180)
+    assert len(everything) == 4
+
+
+def test_cluster_records_merges_nearby_points_at_low_zoom():
+    """Nearby records share a cluster at low zoom and split apart when zoomed in."""
+    located = RECORDS[:4]
+    low = {cluster["count"] for cluster in cluster_records(located, zoom=5)}
+    assert low == {2, 1}
+
+    high = cluster_records(located, zoom=14)
+    assert len(high) == 4
+    assert all(cluster["count"] == 1 for cluster in high)
+
+
+def test_density_grids_aggregate_incrementally():
+    """Heatmap cells are counted once per record and normalized per zoom."""
+    grids = DensityGrids()
+    assert grids.add_records(RECORDS) == 4
+    assert grids.add_records(RECORDS) == 0
+
+    cells = grids.cells(zoom=3)
+    assert len(cells) == 3
+    assert max(weight for _, _, weight in cells) == 1.0
+    assert sorted(weight for _, _, weight in cells) == [0.5, 0.5, 1.0]
+
+    assert grids.add_records([{"id": "new", "latitude": 28.6, "longitude": 77.2}]) == 1
+    mumbai_only = grids.cells(zoom=10, bounds=(18.9, 72.7, 19.2, 73.0))
+    assert len(mumbai_only) == 1
+
+
+def test_nearest_uses_great_circle_distance():
+    """Nearest neighbour search only returns points within the radius."""
+    from geo_index import haversine_km
+
+    assert round(haversine_km(17.385, 78.4867, 19.076, 72.8777)) == 621
+    index = GridIndex.from_records(RECORDS)
+    assert index.nearest(17.40, 78.49, max_km=50)["id"] == "hyd"
+    assert index.nearest(13.08, 80.27, max_km=100) is None
+
+
+def test_within_radius_refines_bbox_candidates():
+    # Charminar, Secunderabad (~6 km), Gachibowli (~15 km), Mumbai (~620 km)
+    candidates = [
+        ("mumbai", 19.0760, 72.8777),
+        ("gachibowli", 17.4401, 78.3489),
+        ("secunderabad", 17.4399, 78.4983),
+        ("charminar", 17.3616, 78.4747),
+        ("no-coordinates", None, None),
+    ]
+    lat, lon = 17.3616, 78.4747
+    south, west, north, east = bbox_around(lat, lon, 10)
+    # A bbox corner is farther than the radius; the exact refinement drops it
+    corner = ("corner", north - 0.001, east - 0.001)
+    assert haversine_km(lat, lon, *corner[1:]) > 10
+
+    nearest = within_radius(candidates + [corner], lat, lon, 10, limit=5)
+    assert [record_id for record_id, _ in nearest] == ["charminar", "secunderabad"]
+    assert nearest[0][1] == 0.0
+
+    assert [r for r, _ in within_radius(candidates, lat, lon, 20, limit=2)] == ["charminar", "secunderabad"]
+    assert within_radius([], lat, lon, 10, 5) == []
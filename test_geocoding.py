@@ -0,0 +1,63 @@
+import json
+
+from geocoding import Gazetteer, StateResolver, normalize_place_name
+from record_filters import RecordFilterIndex
+
+
+def test_normalize_place_name():
+    assert normalize_place_name("  Hyderabad,  TELANGANA , India ") == "hyderabad, telangana"
+    assert normalize_place_name("Vasco-da-Gama") == "vasco da gama"
+
+
+def test_gazetteer_resolves_aliases_and_state_qualifiers():
+    gazetteer = Gazetteer()
+    assert gazetteer.lookup("Bombay")["name"] == "Mumbai"
+    assert gazetteer.lookup("Hyderabad, Telangana")["state"] == "Telangana"
+    assert gazetteer.lookup("Hyderabad, Kerala") is None
+    assert gazetteer.lookup("Kondapur, Hyderabad") is None
+
+
+def test_state_resolver_prefers_boundaries(tmp_path):
+    """Boundary polygons win over the nearest gazetteer place."""
+    resolver = StateResolver()
+    assert resolver.resolve(17.37, 78.47) == {"state": "Telangana", "nearest_place": "Hyderabad"}
+    assert resolver.resolve(0.0, 0.0) == {"state": None, "nearest_place": None}
+
+    square = [[78.0, 17.0], [79.0, 17.0], [79.0, 18.0], [78.0, 18.0], [78.0, 17.0]]
+    boundaries = tmp_path / "states.geojson"
+    boundaries.write_text(json.dumps({
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "properties": {"st_nm": "Test State"},
+            "geometry": {"type": "Polygon", "coordinates": [square]},
+        }],
+    }))
+    resolver = StateResolver(boundaries_path=str(boundaries))
+    assert resolver.resolve(17.45, 78.40)["state"] == "Test State"
+    assert resolver.resolve(19.07, 72.87)["state"] is None
+
+
+def test_filter_index_resolves_state_without_changing_records():
+    resolver = StateResolver()
+    record = {"id": 1, "dialect_word": "Baingan", "location_text": "Hyderabad",
+              "latitude": 17.385, "longitude": 78.4867}
+    index = RecordFilterIndex([record], lambda lat, lon: resolver.resolve(lat, lon)["state"])
+    assert "state" not in record
+    assert index.query(state="Telangana") == [record]
+
+
+def test_filter_index_prefers_the_state_named_in_the_text():
+    resolver = StateResolver()
+    record = {"id": 1, "dialect_word": "Baingan", "location_text": "Bidar, Karnataka",
+              "latitude": 17.9104, "longitude": 77.5199}
+    index = RecordFilterIndex([record], lambda lat, lon: resolver.resolve(lat, lon)["state"])
+    assert index.query(state="Karnataka") == [record]
+    assert index.query(state="Telangana") == []
+
+
+def test_state_resolver_leaves_border_points_unresolved():
+    resolver = StateResolver()
+    # Equidistant between Chandigarh and Panchkula
+    assert resolver.resolve(30.714, 76.82)["state"] is None
+    assert resolver.resolve(16.7333, 82.2167)["state"] == "Puducherry"
@@ -0,0 +1,46 @@
+import io
+import json
+
+import pytest
+
+from record_batches import BatchError, chunked, parse_rows, validate_rows
+
+
+def ndjson(*rows):
+    return io.BytesIO("\n".join(json.dumps(row) for row in rows).encode() + b"\n\n")
+
+
+def test_parse_ndjson_and_json_array():
+    rows = parse_rows(ndjson({"title": "a"}, {"id": 1, "op": "delete"}), "application/x-ndjson")
+    assert rows == [{"title": "a"}, {"id": 1, "op": "delete"}]
+
+    body = io.BytesIO(json.dumps({"records": [{"title": "a"}]}).encode())
+    assert parse_rows(body, "application/json") == [{"title": "a"}]
+
+    with pytest.raises(BatchError):
+        parse_rows(io.BytesIO(b'{"title": "a"}'), "application/json")
+
+
+def test_validate_rows_reports_every_bad_row():
+    create = {"title": "Cycle", "latitude": "17.4", "longitude": 78.5,
+              "category_id": "c1", "user_id": "u1"}
+    rows = parse_rows(io.BytesIO(b"\n".join([
+        json.dumps(create).encode(),
+        b"{not json",
+        json.dumps({"id": 7, "language": "te"}).encode(),
+        json.dumps({"op": "delete"}).encode(),
+        json.dumps(dict(create, latitude=123)).encode(),
+        json.dumps(dict(create, colour="red")).encode(),
+    ])), "application/x-ndjson")
+
+    valid, errors = validate_rows(rows)
+
+    assert [(row["index"], row["op"]) for row in valid] == [(0, "create"), (2, "update")]
+    assert valid[0]["fields"]["latitude"] == 17.4
+    assert [error["index"] for error in errors] == [1, 3, 4, 5]
+    assert "Invalid JSON" in errors[0]["error"]
+    assert "colour" in errors[3]["error"]
+
+
+def test_chunked():
+    assert [len(chunk) for chunk in chunked(list(range(1201)), 500)] == [500, 500, 201]
@@ -0,0 +1,55 @@
+from record_filters import RecordFilterIndex, states_in_text
+
+RECORDS = [
+    {"id": 1, "dialect_word": "Baingan", "location_text": "Hyderabad, Telangana", "category_id": "food"},
+    {"id": 2, "dialect_word": "Vankaya", "location_text": "Warangal, Telangana", "category_id": "food"},
+    {"id": 3, "dialect_word": "Cycle", "location_text": "Mumbai, Maharashtra", "category_id": "travel"},
+    {"id": 4, "dialect_word": "Brinjal", "location_text": "Chennai, Tamil Nadu"},
+]
+
+
+def _ids(records):
+    return [record["id"] for record in records]
+
+
+def test_states_in_text_matches_full_state_names():
+    assert states_in_text("Silvassa, Dadra and Nagar Haveli and Daman and Diu") == {
+        "Dadra and Nagar Haveli and Daman and Diu"
+    }
+    assert states_in_text("hyderabad, TELANGANA") == {"Telangana"}
+    assert states_in_text("Hyderabad") == set()
+
+
+def test_query_combines_filters():
+    """Search, state and category filters intersect and keep record order."""
+    index = RecordFilterIndex(RECORDS)
+    assert _ids(index.query()) == [1, 2, 3, 4]
+    assert _ids(index.query(search_query="N")) == [1, 2, 4]
+    assert _ids(index.query(state="Telangana")) == [1, 2]
+    assert _ids(index.query(search_query="baing", state="Telangana")) == [1]
+    assert _ids(index.query(category_id="food", state="Maharashtra")) == []
+    assert _ids(index.query(category_id="travel")) == [3]
+
+
+def test_add_updates_indexes_incrementally():
+    index = RecordFilterIndex(RECORDS)
+    assert _ids(index.query(search_query="vank")) == [2]
+    index.add({"id": 5, "dialect_word": "Vankai", "location_text": "Guntur, Andhra Pradesh"})
+    assert _ids(index.query(search_query="vank")) == [2, 5]
+    assert _ids(index.query(state="Andhra Pradesh")) == [5]
+
+
+def test_filtered_results_are_cached_and_extended_on_add():
+    records = [dict(r, latitude=17.0 + r["id"], longitude=78.0) for r in RECORDS]
+    index = RecordFilterIndex(records)
+    telangana = index.filtered(state="Telangana")
+    assert _ids(telangana.records) == [1, 2]
+    assert index.filtered(state="Telangana") is telangana
+    assert _ids(telangana.grid.query_bbox(17.5, 77.0, 18.5, 79.0)) == [1]
+
+    index.add({"id": 5, "dialect_word": "Vankai", "location_text": "Nalgonda, Telangana",
+               "latitude": 17.05, "longitude": 79.27})
+    index.add({"id": 6, "dialect_word": "Cycle", "location_text": "Pune, Maharashtra"})
+    assert _ids(telangana.records) == [1, 2, 5]
+    assert _ids(telangana.map_records) == [1, 2, 5]
+    assert _ids(index.filtered(search_query="cycle").records) == [3, 6]
@@ -0,0 +1,40 @@
+import pytest
+
+from record_queries import (
+    LATITUDE_BANDS_PER_DEGREE, MAX_PAGE_SIZE, QueryError, decode_cursor, encode_cursor, latitude_bands,
+    parse_bbox, parse_fields, parse_limit,
+)
+
+
+def test_cursor_round_trip():
+    for key in (42, "0b6f1c7e-uuid", None):
+        assert decode_cursor(encode_cursor(key)) == key
+    assert decode_cursor("") is None
+    with pytest.raises(QueryError):
+        decode_cursor("not a cursor!")
+
+
+def test_parse_limit_bbox_and_fields():
+    assert parse_limit(None) == 50
+    assert parse_limit("100000") == MAX_PAGE_SIZE
+    with pytest.raises(QueryError):
+        parse_limit("0")
+
+    assert parse_bbox("8,68,37,97") == (8.0, 68.0, 37.0, 97.0)
+    for bad in ("8,68,37", "37,68,8,97", "8,x,37,97"):
+        with pytest.raises(QueryError):
+            parse_bbox(bad)
+
+    columns = ["id", "title", "latitude", "longitude"]
+    assert parse_fields("title, latitude,title", columns) == ["id", "title", "latitude"]
+    assert parse_fields("", columns) is None
+    with pytest.raises(QueryError):
+        parse_fields("password", columns)
+
+
+def test_latitude_bands_cover_the_range_whichever_way_bands_round():
+    bands = latitude_bands(17.26, 17.46)
+    assert bands == list(range(171, 177))
+    for lat in (17.26, 17.3616, 17.46, -0.05, 0.05):
+        for band in (int(lat * LATITUDE_BANDS_PER_DEGREE), round(lat * LATITUDE_BANDS_PER_DEGREE)):
+            assert band in latitude_bands(min(lat, 17.26), max(lat, 17.46))
@@ -0,0 +1,122 @@
+import pytest
+
+from record_store import RecordStore
+
+
+def record(record_id, updated_at, **fields):
+    return dict({"id": record_id, "dialect_word": record_id, "updated_at": updated_at}, **fields)
+
+
+class FakeAPI:
+    def __init__(self, records):
+        self.records = records
+        self.cursors = []
+
+    def fetch(self, cursor):
+        self.cursors.append(cursor)
+        return [r for r in self.records if cursor is None or r["updated_at"] >= cursor]
+
+
+def test_delta_sync_fetches_only_changes_since_cursor():
+    api = FakeAPI([record("a", "2025-01-01"), record("b", "2025-01-02")])
+    store = RecordStore()
+
+    assert store.sync(api.fetch)["full"] is True
+    assert [r["id"] for r in store.records] == ["a", "b"]
+
+    api.records.append(record("c", "2025-01-03"))
+    api.records[0] = record("a", "2025-01-04", dialect_word="Cycle")
+    changes = store.sync(api.fetch)
+
+    assert api.cursors == [None, "2025-01-02"]
+    assert [r["id"] for r in changes["added"]] == ["c"]
+    assert [r["id"] for r in changes["updated"]] == ["a"]
+    assert store.cursor == "2025-01-04"
+    assert {r["id"]: r["dialect_word"] for r in store.records}["a"] == "Cycle"
+
+
+def test_tombstones_and_reconcile_remove_records():
+    api = FakeAPI([record("a", "2025-01-01"), record("b", "2025-01-01"), record("c", "2025-01-01")])
+    store = RecordStore(reconcile_interval=3600)
+    store.sync(api.fetch)
+
+    api.records.append(record("a", "2025-01-02", is_deleted=True))
+    assert store.sync(api.fetch)["removed"] == ["a"]
+
+    # "b" disappears upstream without a tombstone; only a full reload notices
+    api.records = [r for r in api.records if r["id"] == "c"]
+    assert store.sync(api.fetch)["removed"] == []
+    assert store.sync(api.fetch, full=True)["removed"] == ["b"]
+    assert [r["id"] for r in store.records] == ["c"]
+
+
+def test_failed_reload_keeps_records_and_local_fields():
+    store = RecordStore()
+    store.sync(lambda cursor: [record("a", "2025-01-01")])
+    store.records[0]["state"] = "Telangana"
+
+    def failing(cursor):
+        yield record("a", "2025-01-01")
+        raise ConnectionError("API down")
+
+    with pytest.raises(ConnectionError):
+        store.sync(failing, full=True)
+
+    assert [r["id"] for r in store.records] == ["a"]
+    assert store.records[0]["state"] == "Telangana"
+
+
+def test_cursor_compares_timestamps_not_strings():
+    store = RecordStore()
+    store.sync(lambda cursor: [record("a", "2025-01-01T10:00:00+00:00"),
+                               record("b", "2025-01-01T09:00:00Z")])
+    assert store.cursor == "2025-01-01T10:00:00+00:00"
+
+
+def test_ignored_cursor_falls_back_to_full_reloads():
+    api = FakeAPI([record("a", "2025-01-01"), record("b", "2025-01-02")])
+    store = RecordStore()
+    store.sync(api.fetch)
+
+    # The API returns everything, whatever the cursor
+    api.fetch = lambda cursor: api.cursors.append(cursor) or list(api.records)
+    assert store.sync(api.fetch)["full"] is False
+    assert store.supports_delta is False
+    assert store.sync(api.fetch)["full"] is True
+
+
+def test_failed_first_sync_is_raised_and_retried():
+    store = RecordStore(retry_interval=0)
+
+    def failing(cursor):
+        raise ConnectionError("API down")
+
+    with pytest.raises(ConnectionError):
+        store.sync_if_due(failing, interval=120)
+    assert not store.loaded and store.synced_at == 0
+
+    assert store.sync_if_due(lambda cursor: [record("a", "2025-01-01")], interval=120)["full"]
+    synced_at = store.synced_at
+    with pytest.raises(ConnectionError):
+        store.sync(failing)
+    assert store.synced_at == synced_at
+    assert [r["id"] for r in store.records] == ["a"]
+
+
+def test_server_copy_of_a_local_add_is_not_an_update():
+    api = FakeAPI([record("a", "2025-01-01")])
+    store = RecordStore()
+    store.sync(api.fetch)
+
+    local = {"id": "b", "dialect_word": "Cycle", "nearest_place": "Hyderabad"}
+    store.add(local)
+    api.records.append(record("b", "2025-01-02", image_path="/media/b.png"))
+    changes = store.sync(api.fetch)
+
+    assert changes["added"] == [] and changes["updated"] == []
+    # Caches patched with the local record see the server's fields too
+    assert local["updated_at"] == "2025-01-02" and local["image_path"] == "/media/b.png"
+    assert local["nearest_place"] == "Hyderabad"
+
+    api.records[1] = record("b", "2025-01-03", dialect_word="Bicycle")
+    assert [r["id"] for r in store.sync(api.fetch)["updated"]] == ["b"]
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import os
+import threading
+
+import pytest
+
+import record_uploads
+from record_uploads import UploadError, UploadSessions
+
+CHUNK = record_uploads.MIN_CHUNK_SIZE
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    return UploadSessions(str(tmp_path / "spool"), str(tmp_path / "media"))
+
+
+def chunks_of(data):
+    return [data[i:i + CHUNK] for i in range(0, len(data), CHUNK)]
+
+
+def test_parallel_out_of_order_chunks_assemble(uploads):
+    data = bytes(range(256)) * (CHUNK * 3 // 256) + b"tail"
+    session = uploads.create("../photo.jpg", len(data), CHUNK, hashlib.sha256(data).hexdigest())
+    assert session["total_chunks"] == 4
+
+    parts = chunks_of(data)
+    threads = [
+        threading.Thread(target=uploads.write_chunk, args=(
+            session["upload_id"], index, io.BytesIO(parts[index]),
+            hashlib.sha256(parts[index]).hexdigest(),
+        ))
+        for index in reversed(range(len(parts)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    upload = uploads.finalize(session["upload_id"])
+    assert upload["stored_name"].endswith("_photo.jpg")
+    with open(upload["path"], "rb") as f:
+        assert f.read() == data
+    with pytest.raises(UploadError):
+        uploads.finalize(session["upload_id"])
+
+
+def test_resume_sends_only_missing_chunks(uploads):
+    data = b"x" * (CHUNK * 2 + 10)
+    upload_id = uploads.create("a.png", len(data), CHUNK)["upload_id"]
+    parts = chunks_of(data)
+
+    uploads.write_chunk(upload_id, 0, io.BytesIO(parts[0]))
+    # Connection dropped half-way through chunk 2
+    with pytest.raises(UploadError):
+        uploads.write_chunk(upload_id, 2, io.BytesIO(parts[2][:5]))
+
+    with pytest.raises(UploadError) as incomplete:
+        uploads.finalize(upload_id)
+    assert incomplete.value.status == 409
+
+    missing = uploads.status(upload_id)["missing_chunks"]
+    assert missing == [1, 2]
+    for index in missing:
+        uploads.write_chunk(upload_id, index, io.BytesIO(parts[index]))
+    with open(uploads.finalize(upload_id)["path"], "rb") as f:
+        assert f.read() == data
+
+
+def test_chunk_checksum_mismatch_is_rejected(uploads):
+    upload_id = uploads.create("a.png", CHUNK, CHUNK)["upload_id"]
+    with pytest.raises(UploadError) as mismatch:
+        uploads.write_chunk(upload_id, 0, io.BytesIO(b"y" * CHUNK), "0" * 64)
+    assert mismatch.value.status == 422
+    assert uploads.status(upload_id)["missing_chunks"] == [0]
+
+
+def test_store_stream_hashes_while_writing(tmp_path):
+    data = b"z" * (record_uploads.STREAM_BUFFER_SIZE * 3 + 7)
+    stored = record_uploads.store_stream(io.BytesIO(data), "../../voice note.ogg", str(tmp_path))
+
+    assert stored["stored_name"].endswith("_voice_note.ogg")
+    assert stored["size"] == len(data)
+    assert stored["sha256"] == hashlib.sha256(data).hexdigest()
+    with open(stored["path"], "rb") as f:
+        assert f.read() == data
+
+    with pytest.raises(UploadError) as too_large:
+        record_uploads.store_stream(io.BytesIO(data), "big.bin", str(tmp_path), limit=100)
+    assert too_large.value.status == 413
+    assert sorted(p.name for p in tmp_path.iterdir()) == [stored["stored_name"]]
+
+
+def test_release_after_failed_save_allows_finalizing_again(uploads):
+    data = b"r" * CHUNK
+    upload_id = uploads.create("a.png", len(data), CHUNK)["upload_id"]
+    uploads.write_chunk(upload_id, 0, io.BytesIO(data))
+
+    first = uploads.finalize(upload_id)
+    # Saving the record failed: the file goes back and the session survives
+    uploads.release(upload_id)
+    assert not os.path.exists(first["path"])
+    assert uploads.status(upload_id)["missing_chunks"] == []
+
+    second = uploads.finalize(upload_id)
+    uploads.complete(upload_id)
+    with open(second["path"], "rb") as f:
+        assert f.read() == data
+    with pytest.raises(UploadError) as gone:
+        uploads.status(upload_id)
+    assert gone.value.status == 404
+
+
+def test_create_expires_stale_sessions_lazily(tmp_path):
+    uploads = UploadSessions(str(tmp_path / "spool"), str(tmp_path / "media"),
+                             session_ttl=-1, expire_interval=0)
+    assert not (tmp_path / "spool").exists()
+
+    stale = uploads.create("a.png", CHUNK, CHUNK)["upload_id"]
+    uploads.create("b.png", CHUNK, CHUNK)
+    with pytest.raises(UploadError):
+        uploads.status(stale)
+
+
+class BlockingStream(io.BytesIO):
+    """Hands out its data only after release is set"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reading = threading.Event()
+        self.release = threading.Event()
+
+    def read(self, size=-1):
+        self.reading.set()
+        self.release.wait(5)
+        return super().read(size)
+
+
+def test_chunk_writes_and_finalize_exclude_each_other(uploads):
+    data = b"w" * CHUNK
+    upload_id = uploads.create("a.png", len(data), CHUNK)["upload_id"]
+    uploads.write_chunk(upload_id, 0, io.BytesIO(data))
+
+    # A resent chunk is being written: finalizing now would hash changing bytes
+    stream = BlockingStream(data)
+    writer = threading.Thread(target=uploads.write_chunk, args=(upload_id, 0, stream))
+    writer.start()
+    assert stream.reading.wait(5)
+    with pytest.raises(UploadError) as busy:
+        uploads.finalize(upload_id)
+    assert busy.value.status == 409
+    stream.release.set()
+    writer.join()
+
+    uploads.finalize(upload_id)
+    with pytest.raises(UploadError) as finalized:
+        uploads.write_chunk(upload_id, 0, io.BytesIO(data))
+    assert finalized.value.status == 409
+
+
+def test_chunk_for_a_removed_spool_file_is_rejected(uploads):
+    upload_id = uploads.create("a.png", CHUNK, CHUNK)["upload_id"]
+    os.remove(os.path.join(uploads.spool_dir, upload_id + ".part"))
+    with pytest.raises(UploadError) as gone:
+        uploads.write_chunk(upload_id, 0, io.BytesIO(b"x" * CHUNK))
+    assert gone.value.status == 409
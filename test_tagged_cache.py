@@ -0,0 +1,60 @@
+import tagged_cache
+from tagged_cache import TaggedCache
+
+
+def test_get_or_load_caches_until_ttl_expires(monkeypatch):
+    cache = TaggedCache()
+    now = [100.0]
+    monkeypatch.setattr(tagged_cache.time, "monotonic", lambda: now[0])
+    calls = []
+
+    def load():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_load("geocode", load, ttl=60) == 1
+    assert cache.get_or_load("geocode", load, ttl=60) == 1
+    now[0] += 61
+    assert cache.get_or_load("geocode", load, ttl=60) == 2
+    assert cache.get_or_load("categories", lambda: "no ttl") == "no ttl"
+    now[0] += 10 ** 6
+    assert cache.get_or_load("categories", lambda: "reloaded") == "no ttl"
+
+
+def test_invalidate_drops_only_tagged_entries():
+    cache = TaggedCache()
+    cache.set("stats", 1, tags=("records",))
+    cache.set("index", 2, tags=("records", "filters"))
+    cache.set("geocode", 3)
+
+    cache.invalidate("records")
+
+    assert cache.get("stats") is None and cache.get("index") is None
+    assert cache.get("geocode") == 3
+
+
+def test_update_patches_entries_with_updaters_and_drops_the_rest():
+    cache = TaggedCache()
+    cache.set("stats", {"count": 1}, tags=("records",))
+    cache.set("index", ["a"], tags=("records",))
+    cache.set("categories", ["c1"], tags=("categories",))
+
+    cache.update("records", {"stats": lambda stats: dict(stats, count=stats["count"] + 1)})
+
+    assert cache.get("stats") == {"count": 2}
+    assert cache.get("index") is None
+    assert cache.get("categories") == ["c1"]
+
+
+def test_value_loaded_across_an_update_is_not_stored():
+    cache = TaggedCache()
+
+    def load():
+        # Another session patches the tag while this load is running
+        cache.update("records", {})
+        return "stale"
+
+    assert cache.get_or_load("stats", load, tags=("records",)) == "stale"
+    assert cache.get("stats") is None
+    assert cache.get_or_load("stats", lambda: "fresh", tags=("records",)) == "fresh"
+    assert cache.get("stats") == "fresh"
@@ -0,0 +1,107 @@
+import io
+import os
+
+from PIL import Image
+
+from thumbnails import ImageFormatCache, ThumbnailCache, make_thumbnail, sniff_image_format
+
+
+def _png_bytes(size=(640, 480), color=(200, 50, 50)):
+    output = io.BytesIO()
+    Image.new("RGB", size, color).save(output, format="PNG")
+    return output.getvalue()
+
+
+def test_sniff_image_format_reads_header_only():
+    """Formats are detected from magic bytes, including truncated data."""
+    assert sniff_image_format(_png_bytes()) == "png"
+    assert sniff_image_format(make_thumbnail(_png_bytes(), (50, 50), "JPEG")[:8]) == "jpeg"
+    assert sniff_image_format(bytearray(b"GIF89a\x01\x00")) == "gif"
+    assert sniff_image_format(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert sniff_image_format(b"not an image") is None
+    assert sniff_image_format(b"") is None
+
+
+def test_make_thumbnail_fits_bounding_box():
+    """Thumbnails keep the aspect ratio and fit inside the requested size."""
+    thumbnail = make_thumbnail(_png_bytes(), (150, 150), image_format="JPEG")
+    image = Image.open(io.BytesIO(thumbnail))
+    assert image.format == "JPEG"
+    assert image.width == 150
+    assert image.height in (112, 113)
+
+
+def test_cache_is_content_addressed(tmp_path):
+    """The same upload is resized once and reused under any alias."""
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), image_format="JPEG")
+    image_data = _png_bytes()
+
+    first = cache.get_or_create(image_data, (150, 150), alias="a:popup")
+    second = cache.get_or_create(image_data, (150, 150), alias="b:popup")
+    assert first == second
+    assert cache.lookup("a:popup") == first
+    assert cache.lookup("missing:popup") is None
+
+    reloaded = ThumbnailCache(str(tmp_path / "thumbs"), image_format="JPEG")
+    assert reloaded.lookup("b:popup") == first
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Eviction removes the oldest thumbnails once max_bytes is exceeded."""
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), max_bytes=10**9, image_format="JPEG")
+    names = [
+        cache.get_or_create(_png_bytes(color=(i, i, i)), (150, 150), alias=str(i))
+        for i in range(3)
+    ]
+    for i, name in enumerate(names):
+        os.utime(cache.path(name), (1000 + i, 1000 + i))
+    cache.max_bytes = cache.total_bytes - 1
+    cache.lookup("0")  # mark the first thumbnail as recently used
+    cache.get_or_create(_png_bytes(color=(9, 9, 9)), (150, 150))
+
+    assert cache.total_bytes <= cache.max_bytes
+    assert cache.lookup("0") == names[0]
+    assert cache.lookup("1") is None
+
+
+def test_alias_file_is_compacted_on_load(tmp_path):
+    """Superseded and stale alias lines are dropped when the cache starts."""
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), image_format="JPEG")
+    first = cache.get_or_create(_png_bytes(color=(1, 1, 1)), (150, 150), alias="a")
+    second = cache.get_or_create(_png_bytes(color=(2, 2, 2)), (150, 150), alias="a")
+    with open(cache.alias_path, "a", encoding="utf-8") as f:
+        f.write("gone\tmissing.jpeg\n")
+
+    reloaded = ThumbnailCache(str(tmp_path / "thumbs"), image_format="JPEG")
+
+    assert first != second and reloaded.lookup("a") == second
+    with open(reloaded.alias_path, encoding="utf-8") as f:
+        assert f.read() == f"a\t{second}\n"
+
+
+def test_alias_file_is_kept_out_of_the_served_directory(tmp_path):
+    """Aliases never land in the thumbnail directory; an old file there is moved out."""
+    directory = tmp_path / "thumbs"
+    cache = ThumbnailCache(str(directory), image_format="JPEG")
+    name = cache.get_or_create(_png_bytes(), (150, 150), alias="a")
+    assert os.path.dirname(cache.alias_path) == str(tmp_path)
+    assert not (directory / "aliases.tsv").exists()
+
+    os.replace(cache.alias_path, directory / "aliases.tsv")
+    reloaded = ThumbnailCache(str(directory), image_format="JPEG", alias_path=str(tmp_path / "index.tsv"))
+    assert reloaded.lookup("a") == name
+    assert not (directory / "aliases.tsv").exists()
+    assert (tmp_path / "index.tsv").exists()
+
+
+def test_image_format_cache_evicts_least_recently_used():
+    """The format cache stays bounded and keeps recently read records."""
+    formats = ImageFormatCache(max_entries=10)
+    for i in range(10):
+        formats.set(str(i), "png")
+    assert formats.get("0") == "png"  # mark the first record as recently used
+    formats.set("10", "jpeg")
+
+    assert len(formats) == 9
+    assert formats.get("0") == "png" and formats.get("10") == "jpeg"
+    assert formats.get("1") is None
@@ -0,0 +1,249 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps, features
+
+# Bounding boxes for the derivatives served to the UI
+THUMBNAIL_SIZES = {
+    "popup": (150, 150),
+    "gallery": (480, 480),
+}
+
+# WebP when Pillow was built with it, JPEG otherwise
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMBNAIL_QUALITY = 80
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+# Record ids an ImageFormatCache remembers the image format of
+DEFAULT_MAX_FORMAT_ENTRIES = 10000
+
+_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpeg"}
+_ALIAS_FILE = "aliases.tsv"
+
+# (offset, magic bytes, format) checked against the start of the file
+_SIGNATURES = (
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (8, b"WEBP", "webp"),
+    (0, b"BM", "bmp"),
+    (0, b"II*\x00", "tiff"),
+    (0, b"MM\x00*", "tiff"),
+    (4, b"ftypavif", "avif"),
+)
+
+
+def sniff_image_format(image_data) -> Optional[str]:
+    """Detect the image format from its magic bytes without decoding it"""
+    if not image_data:
+        return None
+    header = memoryview(image_data)[:16]
+    for offset, magic, image_format in _SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            if image_format == "webp" and header[:4] != b"RIFF":
+                continue
+            return image_format
+    return None
+
+
+def make_thumbnail(image_data: bytes, size: Tuple[int, int],
+                   image_format: str = THUMBNAIL_FORMAT,
+                   quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """Downscale an image to fit inside size and encode it"""
+    with Image.open(io.BytesIO(image_data)) as image:
+        # Let the JPEG decoder scale down while decoding instead of afterwards
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size)
+
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        if has_alpha and image_format != "JPEG":
+            image = image.convert("RGBA")
+        else:
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=quality)
+        return output.getvalue()
+
+
+class ThumbnailCache:
+    """Content-addressed on-disk thumbnail cache with size-bounded LRU eviction
+
+    Thumbnails are stored as <sha256 of original>_<width>x<height>.<ext>, so
+    the same upload is only ever resized once per size. File modification
+    times record the last access and drive eviction. A small alias file maps
+    record ids to thumbnails so cached records never need their original
+    bytes downloaded again. It is kept outside directory, which may be
+    served publicly, next to it by default.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+                 image_format: str = THUMBNAIL_FORMAT, alias_path: Optional[str] = None):
+        self.directory = directory
+        self.alias_path = alias_path or f"{os.path.normpath(directory)}.{_ALIAS_FILE}"
+        self.max_bytes = max_bytes
+        self.image_format = image_format
+        self.extension = _EXTENSIONS.get(image_format, image_format.lower())
+        self._lock = threading.Lock()
+        self._sizes: Dict[str, int] = {}
+        self._aliases: Dict[str, str] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Index the files and aliases already on disk"""
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(f".{self.extension}"):
+                self._sizes[entry.name] = entry.stat().st_size
+
+        # Older versions kept the alias file inside the thumbnail directory
+        legacy_path = os.path.join(self.directory, _ALIAS_FILE)
+        lines = 0
+        for alias_path in (legacy_path, self.alias_path):
+            if not os.path.exists(alias_path):
+                continue
+            with open(alias_path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    alias, _, filename = line.rstrip("\n").partition("\t")
+                    if filename in self._sizes:
+                        self._aliases[alias] = filename
+        # The file is append-only between evictions; drop superseded and stale lines
+        if lines > len(self._aliases) or os.path.exists(legacy_path):
+            self._write_aliases()
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def filename_for(self, image_data: bytes, size: Tuple[int, int]) -> str:
+        """Content-hash file name of the thumbnail for image_data at size"""
+        digest = hashlib.sha256(image_data).hexdigest()
+        return f"{digest}_{size[0]}x{size[1]}.{self.extension}"
+
+    def _touch(self, filename: str) -> bool:
+        try:
+            os.utime(self.path(filename))
+            return True
+        except FileNotFoundError:
+            self._sizes.pop(filename, None)
+            return False
+
+    def lookup(self, alias: str) -> Optional[str]:
+        """Get the thumbnail file name registered for an alias, if still cached"""
+        with self._lock:
+            filename = self._aliases.get(alias)
+            if filename and self._touch(filename):
+                return filename
+            self._aliases.pop(alias, None)
+            return None
+
+    def get_or_create(self, image_data: bytes, size: Tuple[int, int],
+                      alias: Optional[str] = None) -> str:
+        """Get the thumbnail file name for image_data, generating it on a miss"""
+        filename = self.filename_for(image_data, size)
+        with self._lock:
+            hit = filename in self._sizes and self._touch(filename)
+
+        if not hit:
+            thumbnail = make_thumbnail(image_data, size, self.image_format)
+            path = self.path(filename)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(thumbnail)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._sizes[filename] = len(thumbnail)
+                self._evict()
+
+        if alias is not None:
+            self._add_alias(alias, filename)
+        return filename
+
+    def _add_alias(self, alias: str, filename: str):
+        with self._lock:
+            if self._aliases.get(alias) == filename:
+                return
+            self._aliases[alias] = filename
+            with open(self.alias_path, "a", encoding="utf-8") as f:
+                f.write(f"{alias}\t{filename}\n")
+
+    def _evict(self):
+        """Delete least recently used thumbnails until the cache fits max_bytes"""
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+
+        by_access = []
+        for filename in self._sizes:
+            try:
+                by_access.append((os.stat(self.path(filename)).st_mtime, filename))
+            except FileNotFoundError:
+                by_access.append((0.0, filename))
+        by_access.sort()
+
+        # Evict down to 90% so we do not rescan on every insert at the limit
+        target = self.max_bytes * 0.9
+        for _, filename in by_access:
+            if total <= target:
+                break
+            total -= self._sizes.pop(filename)
+            try:
+                os.remove(self.path(filename))
+            except FileNotFoundError:
+                pass
+
+        live = set(self._sizes)
+        self._aliases = {a: f for a, f in self._aliases.items() if f in live}
+        self._write_aliases()
+
+    def _write_aliases(self):
+        """Rewrite the alias file with the current aliases only"""
+        path = self.alias_path
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for alias, filename in self._aliases.items():
+                f.write(f"{alias}\t{filename}\n")
+        os.replace(tmp_path, path)
+
+
+class ImageFormatCache:
+    """Record id to image format map with least recently used eviction
+
+    Like ThumbnailCache it is bounded, and once full it is trimmed to 90%
+    of max_entries rather than by one entry on every insert.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_FORMAT_ENTRIES):
+        self.max_entries = max_entries
+        self._formats: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._formats)
+
+    def get(self, record_id: str) -> Optional[str]:
+        with self._lock:
+            image_format = self._formats.get(record_id)
+            if image_format is not None:
+                self._formats.move_to_end(record_id)
+            return image_format
+
+    def set(self, record_id: str, image_format: str):
+        with self._lock:
+            self._formats[record_id] = image_format
+            self._formats.move_to_end(record_id)
+            if len(self._formats) > self.max_entries:
+                target = int(self.max_entries * 0.9)
+                while len(self._formats) > target:
+                    self._formats.popitem(last=False)